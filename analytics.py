@@ -0,0 +1,212 @@
+import csv
+import sys
+import time
+import datetime
+import functools
+
+from task_records import TaskRecord, TaskStatus
+
+# Counters kept per client and week. "created" and "created_completed" are bucketed by the
+# week a task was created (so their ratio is that week's completion rate), "completed" and
+# the completion times by the week it was completed, "overdue" by the week it was due.
+COUNTERS = ("created", "created_completed", "completed", "completion_seconds", "timed_completions", "overdue")
+CREATED, CREATED_COMPLETED, COMPLETED, COMPLETION_SECONDS, TIMED_COMPLETIONS, OVERDUE = range(len(COUNTERS))
+UNKNOWN_WEEK = "unknown"  # Tasks from before timestamps were recorded, with a free-text due date
+CSV_COLUMNS = ("client_id", "week", "created", "completed", "completion_rate", "avg_hours_to_complete", "overdue")
+
+
+@functools.lru_cache(maxsize=4096)
+def week_of_ordinal(ordinal):
+    """Returns the ISO week label ("2024-W07") of a date ordinal, UNKNOWN_WEEK for 0."""
+    if ordinal <= 0:
+        return UNKNOWN_WEEK
+    year, week, _ = datetime.date.fromordinal(ordinal).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def week_of_timestamp(seconds):
+    return week_of_ordinal(datetime.date.fromtimestamp(seconds).toordinal())
+
+
+def contributions(task):
+    """Returns [(week, counter index, amount)] that a TaskRecord adds to its client's counters.
+
+    Tasks without timestamps (created before they were recorded) are counted in
+    the week they are due instead, and have no time to complete.
+    """
+    created_week = week_of_timestamp(task.created) if task.created is not None else week_of_ordinal(task.due)
+    result = [(created_week, CREATED, 1)]
+    if task.status == TaskStatus.COMPLETED:
+        completed_week = week_of_timestamp(task.completed) if task.completed is not None else created_week
+        result.append((created_week, CREATED_COMPLETED, 1))
+        result.append((completed_week, COMPLETED, 1))
+        if task.created is not None and task.completed is not None:
+            result.append((completed_week, COMPLETION_SECONDS, max(0, task.completed - task.created)))
+            result.append((completed_week, TIMED_COMPLETIONS, 1))
+    elif task.status == TaskStatus.OVERDUE:
+        result.append((week_of_ordinal(task.due) if task.due > 0 else created_week, OVERDUE, 1))
+    return result
+
+
+def metrics(counts):
+    """Turns a list of COUNTERS into the reported {"created", "completed", "completion_rate", ...} values."""
+    created = counts[CREATED]
+    timed = counts[TIMED_COMPLETIONS]
+    return {
+        "created": created,
+        "completed": counts[COMPLETED],
+        "completion_rate": round(counts[CREATED_COMPLETED] / created, 4) if created else None,
+        "avg_hours_to_complete": round(counts[COMPLETION_SECONDS] / timed / 3600, 2) if timed else None,
+        "overdue": counts[OVERDUE],
+    }
+
+
+class TaskAnalytics:
+    """Task completion metrics per client and ISO week, maintained incrementally.
+
+    Every task adds the fixed amounts given by `contributions()` to its client's
+    {week: counters}. Callers `remove()` a task before changing its status or due
+    date and `add()` it back afterwards, so reports only ever sum the counters and
+    never look at the tasks themselves; `rebuild()` recounts everything, e.g. when
+    no saved counters exist yet. Archiving a task doesn't change the counters,
+    deleting one does.
+
+    There is no lock of its own: the server calls it under data_lock, in the same
+    critical section as the task change.
+    """
+
+    def __init__(self):
+        self._counters = {}  # {client_id: {week: [count per COUNTERS]}}
+        self.updates = 0
+
+    def add(self, client_id, task, sign=1):
+        weeks = self._counters.setdefault(client_id, {})
+        for week, index, amount in contributions(task):
+            counts = weeks.get(week)
+            if counts is None:
+                counts = weeks[week] = [0] * len(COUNTERS)
+            counts[index] += sign * amount
+            if sign < 0 and not any(counts):
+                del weeks[week]
+        if not weeks:
+            del self._counters[client_id]
+        self.updates += 1
+
+    def remove(self, client_id, task):
+        self.add(client_id, task, -1)
+
+    def drop_client(self, client_id):
+        self._counters.pop(client_id, None)
+
+    def rebuild(self, task_items):
+        """Recounts from (client_id, [TaskRecord or task dict]) pairs. Returns the number of tasks counted."""
+        self._counters = {}
+        count = 0
+        for client_id, task_list in task_items:
+            for task in task_list:
+                self.add(client_id, task if isinstance(task, TaskRecord) else TaskRecord.from_dict(task))
+                count += 1
+        return count
+
+    # --- Persistence and replication ---
+
+    def to_dict(self):
+        return {client_id: {week: list(counts) for week, counts in weeks.items()}
+                for client_id, weeks in self._counters.items()}
+
+    def load(self, data):
+        self._counters = {}
+        for client_id, weeks in data.items():
+            self.set_client(client_id, weeks)
+
+    def client_ids(self):
+        return list(self._counters)
+
+    def client_counters(self, client_id):
+        return self._counters.get(client_id, {})
+
+    def set_client(self, client_id, weeks):
+        """Replaces a client's {week: counters}, e.g. with ones replicated from the primary. None drops the client."""
+        if weeks:
+            self._counters[client_id] = {week: list(counts) for week, counts in weeks.items()}
+        else:
+            self._counters.pop(client_id, None)
+
+    # --- Reports ---
+
+    def summary(self, group_by="client", client_id=None):
+        """Returns metrics() rows with a "client_id" or "week" key, optionally for one client only.
+
+        Costs one pass over the counters, i.e. clients x active weeks, however many tasks there are.
+        """
+        totals = {}
+        for cid, weeks in self._counters.items():
+            if client_id is not None and cid != client_id:
+                continue
+            for week, counts in weeks.items():
+                key = cid if group_by == "client" else week
+                total = totals.get(key)
+                if total is None:
+                    total = totals[key] = [0] * len(COUNTERS)
+                for i, value in enumerate(counts):
+                    total[i] += value
+        return [{group_by: key, **metrics(total)} for key, total in sorted(totals.items())]
+
+    def rows(self):
+        """Yields one CSV_COLUMNS dict per client and week."""
+        for client_id in sorted(self._counters):
+            for week, counts in sorted(self._counters[client_id].items()):
+                yield {"client_id": client_id, "week": week, **metrics(counts)}
+
+    def write_csv(self, path, rows=None):
+        """Writes `rows` (default: every client and week) to a CSV file. Returns the number of rows."""
+        rows = list(self.rows() if rows is None else rows)
+        columns = list(rows[0]) if rows else list(CSV_COLUMNS)
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+
+def _benchmark(task_count):
+    """Compares refreshing a report from incremental counters against rescanning every task."""
+    now = int(time.time())
+    client_count = max(1, task_count // 200)
+    all_tasks = {}
+    for c in range(client_count):
+        task_list = all_tasks[f"client{c}"] = []
+        for i in range(200):
+            created = now - (i * 7919 % 90) * 86400
+            task = TaskRecord(f"Task {c}-{i}", datetime.date.fromtimestamp(created).toordinal() + 7,
+                              TaskStatus(i % 4), None, c * 200 + i, created)
+            if task.status == TaskStatus.COMPLETED:
+                task.completed = created + i * 3600
+            task_list.append(task)
+
+    analytics = TaskAnalytics()
+    start = time.perf_counter()
+    analytics.rebuild(all_tasks.items())
+    rescan = time.perf_counter() - start
+    start = time.perf_counter()
+    analytics.summary("client")
+    analytics.summary("week")
+    report = time.perf_counter() - start
+    task = all_tasks["client0"][0]
+    start = time.perf_counter()
+    for _ in range(10_000):
+        analytics.remove("client0", task)
+        task.set_status(TaskStatus.COMPLETED, now)
+        analytics.add("client0", task)
+        analytics.remove("client0", task)
+        task.set_status(TaskStatus.PENDING)
+        analytics.add("client0", task)
+    update = (time.perf_counter() - start) / 20_000
+    print(f"{client_count * 200} tasks, {client_count} clients")
+    print(f"  full rescan            {rescan * 1000:8.1f} ms")
+    print(f"  report from counters   {report * 1000:8.1f} ms  (both tables)")
+    print(f"  per-mutation update    {update * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,143 @@
+import sys
+import json
+import sqlite3
+import datetime
+import threading
+
+
+def estimate_size(value):
+    """Roughly estimates the memory held by a JSON-like value (dicts, lists, slotted records and scalars)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    elif hasattr(value, "__slots__"):
+        size += sum(estimate_size(getattr(value, slot, None)) for slot in value.__slots__)
+    return size
+
+
+class ArchiveStore:
+    """Cold store for completed tasks and read notifications, backed by SQLite."""
+
+    def __init__(self, path="archive.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript('''
+        CREATE TABLE IF NOT EXISTS archived_tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_id TEXT NOT NULL,
+            description TEXT,
+            due_date TEXT,
+            status TEXT,
+            archived_at TEXT,
+            data TEXT
+        );
+        CREATE INDEX IF NOT EXISTS archived_tasks_client ON archived_tasks (client_id, id);
+
+        CREATE TABLE IF NOT EXISTS archived_notifications (
+            id INTEGER PRIMARY KEY,
+            client_id TEXT NOT NULL,
+            message TEXT,
+            timestamp TEXT,
+            read_timestamp TEXT,
+            archived_at TEXT,
+            data TEXT
+        );
+        CREATE INDEX IF NOT EXISTS archived_notifications_client ON archived_notifications (client_id, id);
+        ''')
+        self._conn.commit()
+
+    def add_tasks(self, rows):
+        """Archives [(client_id, task dict)] in one transaction. Returns the new row ids."""
+        archived_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        row_ids = []
+        with self._lock, self._conn:
+            for client_id, task in rows:
+                cursor = self._conn.execute(
+                    "INSERT INTO archived_tasks (client_id, description, due_date, status, archived_at, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (client_id, task.get("description"), task.get("due_date"), task.get("status"),
+                     archived_at, json.dumps(task)))
+                row_ids.append(cursor.lastrowid)
+        return row_ids
+
+    def delete_tasks(self, row_ids):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM archived_tasks WHERE id = ?", [(row_id,) for row_id in row_ids])
+
+    def add_notifications(self, notifications):
+        """Archives notification dicts in one transaction, keyed by their notification id."""
+        archived_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO archived_notifications "
+                "(id, client_id, message, timestamp, read_timestamp, archived_at, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(n["id"], n["client_id"], n.get("message"), n.get("timestamp"), n.get("read_timestamp"),
+                  archived_at, json.dumps(n)) for n in notifications])
+
+    def delete_notifications(self, notification_ids):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM archived_notifications WHERE id = ?",
+                                   [(notification_id,) for notification_id in notification_ids])
+
+    def task_page(self, client_id, before_id=None, limit=50):
+        """Returns (tasks newest first, id to continue below) for one client's archived tasks."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, data FROM archived_tasks WHERE client_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (client_id, before_id if before_id is not None else sys.maxsize, limit)).fetchall()
+        page = [json.loads(data) for _, data in rows]
+        return page, (rows[-1][0] if len(rows) == limit else None)
+
+    def iter_tasks(self, batch_size=5000):
+        """Yields (client_id, task dict) for every archived task, reading `batch_size` rows per query."""
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute("SELECT id, client_id, data FROM archived_tasks WHERE id > ? ORDER BY id LIMIT ?",
+                                          (last_id, batch_size)).fetchall()
+            for _, client_id, data in rows:
+                yield client_id, json.loads(data)
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    def search(self, client_id=None, text=None, limit=500):
+        """Returns archived tasks and notifications matching an optional client id and text."""
+        results = []
+        with self._lock:
+            for kind, table, text_column in (("Task", "archived_tasks", "description"),
+                                             ("Notification", "archived_notifications", "message")):
+                query = f"SELECT client_id, archived_at, data FROM {table} WHERE 1 = 1"
+                params = []
+                if client_id:
+                    query += " AND client_id = ?"
+                    params.append(client_id)
+                if text:
+                    query += f" AND {text_column} LIKE ?"
+                    params.append(f"%{text}%")
+                query += " ORDER BY id DESC LIMIT ?"
+                params.append(limit)
+                for row_client_id, archived_at, data in self._conn.execute(query, params):
+                    results.append({"kind": kind, "client_id": row_client_id, "archived_at": archived_at,
+                                    "data": json.loads(data)})
+        return results
+
+    def max_ids(self):
+        """Returns (highest archived notification id, highest archived task uid) so ids are never reused."""
+        with self._lock:
+            notification_id = self._conn.execute("SELECT MAX(id) FROM archived_notifications").fetchone()[0]
+            task_uid = self._conn.execute("SELECT MAX(json_extract(data, '$.uid')) FROM archived_tasks").fetchone()[0]
+        return notification_id or 0, task_uid or 0
+
+    def counts(self):
+        with self._lock:
+            task_count = self._conn.execute("SELECT COUNT(*) FROM archived_tasks").fetchone()[0]
+            notification_count = self._conn.execute("SELECT COUNT(*) FROM archived_notifications").fetchone()[0]
+        return task_count, notification_count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
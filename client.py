@@ -1,33 +1,77 @@
 import sys
 import json
 import socket
+import ssl
 import threading
 import time
 import os
+import uuid
+import bisect
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QWidget,
     QListWidget, QPushButton, QLabel, QSystemTrayIcon, QMessageBox, QMenu, QListWidgetItem,
     QTabWidget, QInputDialog
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
 from PyQt6.QtGui import QIcon, QCloseEvent, QAction
+from transport import client_tls_context, client_handshake, TLS_CERT_FILE
 
 CLIENT_CONFIG_FILE = "client_config.json"
+CLIENT_CACHE_FILE = "client_cache.json"  # Last known tasks/notifications, shown before the server answers
+CLIENT_OUTBOX_FILE = "client_outbox.json"  # Changes not yet acknowledged by the server
+HISTORY_PAGE_SIZE = 50  # Completed tasks requested per page in the History tab
+CACHE_SAVE_DELAY = 500  # Milliseconds to coalesce cache writes
+NOTIFICATION_BATCH_DELAY = 300  # Milliseconds to gather a burst of live notifications into one batch
+
+
+def write_json_atomic(path, data):
+    """Writes JSON via a temp file and a rename, so a crash never leaves a half-written file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_json(path, default):
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
 
 class ClientGUI(QMainWindow):
 
     update_signal = pyqtSignal(dict)  # Signal for UI updates
-    notification_signal = pyqtSignal(dict)
+    notification_signal = pyqtSignal(list)  # New notifications, shown and acknowledged as one batch
 
-    def __init__(self, server_host, server_port):
+    def __init__(self, server_host, server_port, tls_context=None, standbys=()):
         super().__init__()
         self.server_host = server_host
         self.server_port = server_port
+        self.endpoints = [(server_host, server_port), *standbys]  # Tried in turn when a server can't be reached
+        self.endpoint_index = 0
+        self.tls_context = tls_context  # ssl.SSLContext to connect with TLS, None for plaintext
+        self.tls_sessions = {}  # {endpoint: last TLS session}, offered on reconnect to skip the full handshake
         self.client_id = self.load_client_id()  # Load client ID
-        self.tasks = []
+        self.tasks = []  # Open tasks, each tagged with its server-side task_id
+        self.history = []  # Completed tasks loaded so far, newest first
+        self.history_cursor = None  # Cursor of the next history page, None when exhausted
+        self.history_requested = None  # Cursor of the page request in flight
         self.notifications = []
+        self.pending_notifications = []  # Received but not yet shown, see queue_notifications
         self.client_socket = None
+        self.reader = None
+        self.chunks = {}  # {stream id: [parts]} of large messages still being received
+        self.session_token = None  # Lets a reconnect resume the session instead of a full sync
+        self.session_seq = 0  # Sequence number of the last update processed in this session
+        self.resume_seq = 0
         self.connected = False
+        self.send_lock = threading.Lock()  # Serialises socket writes and guards the outbox
+        self.outbox = read_json(CLIENT_OUTBOX_FILE, [])  # [{"op_id": str, "message": dict}], oldest first
+        self.load_cache()
 
         self.setWindowTitle(f"Task Manager - {self.client_id if self.client_id else 'Not Logged In'}")
         self.setGeometry(300, 300, 400, 300)
@@ -36,11 +80,14 @@ class ClientGUI(QMainWindow):
         self.setCentralWidget(self.tabs)
 
         self.setup_task_tab()
+        self.setup_history_tab()
         self.setup_notification_tab()
 
         self.status_label = QLabel("Status: Disconnected")
+        self.outbox_label = QLabel()
         central_layout = QVBoxLayout()  # Layout for status label
         central_layout.addWidget(self.status_label)
+        central_layout.addWidget(self.outbox_label)
         central_layout.addWidget(self.tabs)  # Add tabs to central layout
 
         central_widget = QWidget()
@@ -62,8 +109,23 @@ class ClientGUI(QMainWindow):
         self.tray_icon.activated.connect(self.tray_icon_activated)
         # --- End Tray Icon Setup ---
 
+        self.cache_timer = QTimer(self)
+        self.cache_timer.setSingleShot(True)
+        self.cache_timer.setInterval(CACHE_SAVE_DELAY)
+        self.cache_timer.timeout.connect(self.save_cache)
+
+        self.notification_timer = QTimer(self)
+        self.notification_timer.setSingleShot(True)
+        self.notification_timer.setInterval(NOTIFICATION_BATCH_DELAY)
+        self.notification_timer.timeout.connect(self.flush_notifications)
+
         self.update_signal.connect(self.update_ui)
-        self.notification_signal.connect(self.handle_notification)
+        self.notification_signal.connect(self.queue_notifications)
+
+        # Show the cached state right away, the server's initial sync replaces it
+        self.update_ui({"type": "tasks", "data": self.tasks})
+        self.update_ui({"type": "notifications", "data": self.notifications})
+        self.update_ui({"type": "outbox"})
 
         # One-time login (if needed) and connection
         if not self.client_id:
@@ -83,6 +145,40 @@ class ClientGUI(QMainWindow):
         task_layout.addWidget(self.complete_button)
         self.tabs.addTab(self.task_tab, "Tasks")
 
+    def setup_history_tab(self):
+        self.history_tab = QWidget()
+        history_layout = QVBoxLayout(self.history_tab)
+        self.history_list = QListWidget()
+        self.history_list.verticalScrollBar().valueChanged.connect(self.history_scrolled)
+        history_layout.addWidget(QLabel("Completed Tasks:"))
+        history_layout.addWidget(self.history_list)
+        self.load_history_button = QPushButton("Load More")
+        self.load_history_button.clicked.connect(self.request_history_page)
+        self.load_history_button.setEnabled(False)
+        history_layout.addWidget(self.load_history_button)
+        self.tabs.addTab(self.history_tab, "History")
+        self.tabs.currentChanged.connect(self.tab_changed)
+
+    def tab_changed(self, index):
+        # History is only fetched once the user actually looks at it
+        if self.tabs.widget(index) is self.history_tab and not self.history:
+            self.request_history_page()
+
+    def history_scrolled(self, value):
+        if value >= self.history_list.verticalScrollBar().maximum():
+            self.request_history_page()
+
+    def request_history_page(self):
+        """Asks the server for the next page of completed tasks, if any."""
+        if not self.connected or self.history_cursor is None or self.history_requested is not None:
+            return
+        self.history_requested = self.history_cursor
+        try:
+            self.send_message({"history_request": {"cursor": self.history_cursor, "limit": HISTORY_PAGE_SIZE}})
+        except Exception as e:
+            print(f"Error requesting task history: {e}")
+            self.history_requested = None
+
     def setup_notification_tab(self):
         self.notification_tab = QWidget()
         notification_layout = QVBoxLayout(self.notification_tab)
@@ -101,11 +197,114 @@ class ClientGUI(QMainWindow):
             return None
 
     def save_client_id(self, client_id):
-        """Saves the client ID to the config file."""
-        config = {"client_id": client_id}
+        """Saves the client ID to the config file, keeping the other settings."""
+        config = read_json(CLIENT_CONFIG_FILE, {})
+        config["client_id"] = client_id
+        with open(CLIENT_CONFIG_FILE, "w") as file:
+            json.dump(config, file, indent=4)
+
+    def forget_client_id(self):
+        """Removes the client ID from the config file, e.g. once the server rejected it."""
+        config = read_json(CLIENT_CONFIG_FILE, {})
+        config.pop("client_id", None)
         with open(CLIENT_CONFIG_FILE, "w") as file:
             json.dump(config, file, indent=4)
 
+    def load_cache(self):
+        """Loads the tasks and notifications cached for the current client ID, if any."""
+        cache = read_json(CLIENT_CACHE_FILE, {})
+        if self.client_id and cache.get("client_id") == self.client_id:
+            self.tasks = cache.get("tasks", [])
+            self.notifications = cache.get("notifications", [])
+            self.apply_pending_operations()
+
+    def save_cache(self):
+        if not self.client_id:
+            return
+        try:
+            write_json_atomic(CLIENT_CACHE_FILE, {
+                "client_id": self.client_id, "tasks": self.tasks, "notifications": self.notifications})
+        except OSError as e:
+            print(f"Error saving client cache: {e}")
+
+    def clear_local_state(self):
+        """Forgets the cache and any queued changes, e.g. once the client ID is no longer valid."""
+        self.session_token = None
+        with self.send_lock:
+            self.outbox = []
+        for path in (CLIENT_CACHE_FILE, CLIENT_OUTBOX_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+        self.update_signal.emit({"type": "outbox"})
+
+    def send_message(self, message):
+        """Sends one JSON message. Raises OSError if the connection is down."""
+        if not self.connected or self.client_socket is None:
+            raise ConnectionError("Not connected")
+        with self.send_lock:
+            self.client_socket.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+    def queue_operation(self, message):
+        """Stores a change in the durable outbox and sends it if connected.
+
+        Each operation carries an op_id; it stays queued until the server acks
+        that id, and is re-sent after every reconnect until then. The server
+        remembers recent op_ids, so a replay of an already applied change is a no-op.
+        """
+        op = {"op_id": uuid.uuid4().hex, "message": message}
+        with self.send_lock:
+            self.outbox.append(op)
+            self.save_outbox()
+            if self.connected:
+                try:
+                    self.client_socket.sendall((json.dumps({"op_id": op["op_id"], **message}) + "\n").encode("utf-8"))
+                except OSError as e:
+                    print(f"Change queued until the server is reachable: {e}")
+        self.update_signal.emit({"type": "outbox"})
+
+    def replay_outbox(self):
+        """Re-sends every unacknowledged change, oldest first."""
+        with self.send_lock:
+            try:
+                for op in self.outbox:
+                    self.client_socket.sendall((json.dumps({"op_id": op["op_id"], **op["message"]}) + "\n").encode("utf-8"))
+            except OSError as e:
+                print(f"Error replaying queued changes: {e}")
+            if self.outbox:
+                print(f"Replayed {len(self.outbox)} queued change(s)")
+
+    def acknowledge_operation(self, op_id):
+        with self.send_lock:
+            self.outbox = [op for op in self.outbox if op["op_id"] != op_id]
+            self.save_outbox()
+        self.update_signal.emit({"type": "outbox"})
+
+    def save_outbox(self):
+        """Writes the outbox to disk. Caller holds send_lock."""
+        try:
+            write_json_atomic(CLIENT_OUTBOX_FILE, self.outbox)
+        except OSError as e:
+            print(f"Error saving outbox: {e}")
+
+    def apply_pending_operations(self):
+        """Re-applies queued changes to freshly loaded state, which the server sent before seeing them.
+
+        Returns the ids of notifications with a queued read receipt.
+        """
+        with self.send_lock:
+            messages = [op["message"] for op in self.outbox]
+        statuses = {m["task_update"]["uid"]: m["task_update"]["status"]
+                    for m in messages if "task_update" in m and m["task_update"].get("uid") is not None}
+        read_ids = {notification_id for m in messages if "notifications_read" in m for notification_id in m["notifications_read"]}
+        read_ids.update(m["notification_read"] for m in messages if "notification_read" in m)  # Queued by older versions
+        for task in self.tasks:
+            if task.get("uid") in statuses:
+                task["status"] = statuses[task["uid"]]
+        for notification in self.notifications:
+            if notification["id"] in read_ids:
+                notification["status"] = "read"
+        return read_ids
+
     def show_login_dialog(self):
         """Shows a simple dialog to get the client ID."""
         while True:  # Keep asking until a valid ID is entered
@@ -122,26 +321,48 @@ class ClientGUI(QMainWindow):
             else:
                 sys.exit(0)
 
+    def next_endpoint(self, first):
+        """Moves on to the next server. Returns False once all of them were tried since index `first`."""
+        self.endpoint_index = (self.endpoint_index + 1) % len(self.endpoints)
+        return self.endpoint_index != first
+
     def connect_to_server(self):
+        first = self.endpoint_index
         while not self.connected:
+            self.server_host, self.server_port = self.endpoints[self.endpoint_index]
             try:
                 self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 self.client_socket.settimeout(5)
                 self.client_socket.connect((self.server_host, self.server_port))
+                if self.tls_context is not None:
+                    self.client_socket = client_handshake(self.tls_context, self.client_socket, self.server_host,
+                                                          self.tls_sessions.get(self.endpoints[self.endpoint_index]))
                 self.client_socket.settimeout(None)
-                self.client_socket.send(self.client_id.encode("utf-8"))
-
-                response = self.client_socket.recv(1024).decode("utf-8")
-                if not response:
+                # Offer to resume the previous session; the token is only kept again once the server confirms it
+                token, self.resume_seq = self.session_token, self.session_seq
+                self.session_token, self.session_seq = None, 0
+                if token:
+                    hello = json.dumps({"client_id": self.client_id, "session": token, "seq": self.resume_seq})
+                else:
+                    hello = self.client_id
+                self.client_socket.sendall((hello + "\n").encode("utf-8"))
+                self.reader = self.client_socket.makefile("r", encoding="utf-8")  # Messages are newline-delimited JSON
+                self.chunks = {}
+
+                data = self.read_message()
+                if data is None:
                     raise Exception("Connection closed by server")
-                data = json.loads(response)
+                if self.tls_context is not None:
+                    # Taken once the server has answered, so TLS 1.3 session tickets have arrived. Kept
+                    # per server, since only the one that issued a session can resume it
+                    self.tls_sessions[self.endpoints[self.endpoint_index]] = self.client_socket.session
 
                 if data.get("type") == "invalid_id":
                     self.status_label.setText("Status: Invalid Client ID")
                     self.client_socket.close()
                     QMessageBox.warning(self, "Error", "Invalid Client ID. Please contact the administrator.")
-                    if os.path.exists(CLIENT_CONFIG_FILE):
-                        os.remove(CLIENT_CONFIG_FILE)
+                    self.forget_client_id()
+                    self.clear_local_state()
                     self.client_id = None
                     self.show_login_dialog()
                     return
@@ -149,102 +370,89 @@ class ClientGUI(QMainWindow):
                     self.status_label.setText("Status: Client Removed")
                     self.client_socket.close()
                     QMessageBox.warning(self, "Error", "Your client has been removed by the server.")
-                    if os.path.exists(CLIENT_CONFIG_FILE):
-                        os.remove(CLIENT_CONFIG_FILE)
+                    self.forget_client_id()
+                    self.clear_local_state()
                     self.client_id = None
                     self.show_login_dialog()
                     return
 
                 self.connected = True
-                self.status_label.setText("Status: Connected")
+                if self.tls_context is not None:
+                    resumed = ", resumed" if self.client_socket.session_reused else ""
+                    self.status_label.setText(f"Status: Connected ({self.client_socket.version()}{resumed})")
+                else:
+                    self.status_label.setText("Status: Connected")
+                self.handle_message(data)  # The first message already belongs to the initial sync
                 self.listen_thread = threading.Thread(target=self.listen_for_updates, daemon=True)
                 self.listen_thread.start()
+                self.replay_outbox()
 
             except socket.timeout:
+                if self.next_endpoint(first):
+                    continue  # Fail over to the next server right away
                 self.status_label.setText("Status: Connection timeout")
-                QMessageBox.warning(self, "Connection Error", "Server is not responding. Please try again later.")
+                if len(self.endpoints) == 1:  # With standbys, keep retrying quietly while one takes over
+                    QMessageBox.warning(self, "Connection Error", "Server is not responding. Please try again later.")
                 time.sleep(5)
             except ConnectionRefusedError:
+                if self.next_endpoint(first):
+                    continue
                 self.status_label.setText("Status: Server not running")
-                result = QMessageBox.warning(
-                    self,
-                    "Server Offline",
-                    "The server is not running. Try again later?",
-                    QMessageBox.StandardButton.Retry | QMessageBox.StandardButton.Cancel
-                )
-                if result == QMessageBox.StandardButton.Cancel:
-                    sys.exit(0)
+                if len(self.endpoints) == 1:
+                    result = QMessageBox.warning(
+                        self,
+                        "Server Offline",
+                        "The server is not running. Try again later?",
+                        QMessageBox.StandardButton.Retry | QMessageBox.StandardButton.Cancel
+                    )
+                    if result == QMessageBox.StandardButton.Cancel:
+                        sys.exit(0)
                 time.sleep(5)
             except Exception as e:
                 print(f"Connection failed: {e}")
+                if self.next_endpoint(first):
+                    continue
                 self.status_label.setText("Status: Disconnected. Retrying...")
                 time.sleep(5)
 
+    def read_message(self):
+        """Reads the next message, reassembling ones the server split into chunks. Returns None at EOF.
+
+        Chunks of a large message may be interleaved with smaller, more urgent messages.
+        """
+        while True:
+            line = self.reader.readline()
+            if not line:
+                return None
+            data = json.loads(line)
+            if data.get("type") != "chunk":
+                return data
+            chunk = data["data"]
+            self.chunks.setdefault(chunk["id"], []).append(chunk["part"])
+            if not chunk["more"]:
+                return json.loads("".join(self.chunks.pop(chunk["id"])))
+
     def listen_for_updates(self):
         while self.connected:
             try:
-                message = self.client_socket.recv(4096).decode("utf-8")
-                if not message:
-                    break
-                data = json.loads(message)
+                data = self.read_message()
+                if data is None:
+                    raise ConnectionResetError("Connection closed by server")
 
                 if data["type"] == "client_removed":
                     self.connected = False
                     self.status_label.setText("Status: Client Removed")
                     QMessageBox.warning(self, "Removed", "Your client has been removed by the server.")
-                    if os.path.exists(CLIENT_CONFIG_FILE):
-                        os.remove(CLIENT_CONFIG_FILE)
+                    self.forget_client_id()
+                    self.clear_local_state()
                     self.client_id = None
                     self.client_socket.close()
                     self.show_login_dialog()
                     break
 
-                elif data["type"] == "delete_notification":
-                    notification_id = data["data"]["id"]
-                    self.notifications = [n for n in self.notifications if n["id"] != notification_id]
-                    self.update_signal.emit({"type": "notifications", "data": self.notifications})
-
-                elif data["type"] == "initial_notifications":
-                    self.notifications = data["data"]
-                    for notification in self.notifications:
-                        self.notification_signal.emit(notification)
-
-                elif data["type"] == "initial_tasks":  # ✅ FIX: Load tasks when client starts
-                    self.tasks = data["data"]  # Store the tasks received from the server
-                    self.update_signal.emit({"type": "tasks", "data": self.tasks})
-
-                elif data["type"] == "new_task":
-                    self.tasks.append(data["data"])
-                    self.update_signal.emit({"type": "tasks", "data": self.tasks})
-                    self.tray_icon.showMessage(
-                        "New Task Assigned",
-                        f"Task: {data['data']['description']}",
-                        QSystemTrayIcon.MessageIcon.Information,
-                        5000
-                    )
+                self.handle_message(data)
 
-                elif data["type"] == "task_update_admin":
-                    for i, task in enumerate(self.tasks):
-                        if i == data["data"]["task_id"]:
-                            self.tasks[i] = {
-                                "description": data["data"]["description"],
-                                "due_date": data["data"]["due_date"],
-                                "status": data["data"]["status"],
-                            }
-                            break
-                    self.update_signal.emit({"type": "tasks", "data": self.tasks})
-
-                elif data["type"] == "delete_task":
-                    task_id_to_delete = data["data"]["task_id"]
-                    if 0 <= task_id_to_delete < len(self.tasks):
-                        del self.tasks[task_id_to_delete]
-                        self.update_signal.emit({"type": "tasks", "data": self.tasks})
-
-                elif data["type"] == "new_notification":
-                    self.notifications.append(data["data"])
-                    self.notification_signal.emit(data["data"])
-
-            except (ConnectionResetError, BrokenPipeError, json.JSONDecodeError) as e:
+            except (ConnectionResetError, BrokenPipeError, ssl.SSLError, json.JSONDecodeError) as e:
                 print(f"Server connection lost: {e}")
                 self.connected = False
                 self.status_label.setText("Status: Disconnected")
@@ -255,60 +463,220 @@ class ClientGUI(QMainWindow):
                 print(f"An unexpected error occurred: {e}")
                 break
 
+    def handle_message(self, data):
+        """Applies a server message to the local task/notification state."""
+        if "seq" in data:
+            self.session_seq = max(self.session_seq, data["seq"])
+
+        if data["type"] == "session":
+            self.session_token = data["data"]["token"]
+            if data["data"]["resumed"]:  # Local state is kept, missed updates follow
+                self.session_seq = max(self.session_seq, self.resume_seq)
+                # History pages aren't part of the session backlog, so one in flight when the
+                # connection dropped is lost; ask for it again
+                lost_page = self.history_requested is not None
+                self.history_requested = None
+                if lost_page:
+                    self.request_history_page()
+
+        elif data["type"] == "ack":
+            self.acknowledge_operation(data["data"]["op_id"])
+
+        elif data["type"] == "delete_notification":
+            notification_id = data["data"]["id"]
+            self.notifications = [n for n in self.notifications if n["id"] != notification_id]
+            self.update_signal.emit({"type": "notifications", "data": self.notifications})
+
+        elif data["type"] == "initial_notifications":
+            self.notifications = data["data"]
+            read_ids = self.apply_pending_operations()
+            unread = [n for n in self.notifications if n["id"] not in read_ids]  # Others were read while offline
+            if unread:
+                self.notification_signal.emit(unread)
+            else:
+                self.update_signal.emit({"type": "notifications", "data": self.notifications})
+
+        elif data["type"] == "initial_tasks":
+            # Only open tasks are sent up front; completed ones are paged in by the History tab
+            self.tasks = data["data"]["tasks"]
+            self.apply_pending_operations()
+            self.history = []
+            self.history_cursor = data["data"]["history_cursor"]
+            self.history_requested = None
+            self.update_signal.emit({"type": "tasks", "data": self.tasks})
+            self.update_signal.emit({"type": "history", "data": self.history})
+
+        elif data["type"] == "history_page":
+            if data["data"]["cursor"] == self.history_requested:
+                self.history.extend(data["data"]["tasks"])
+                self.history_cursor = data["data"]["next_cursor"]
+                self.history_requested = None
+                self.update_signal.emit({"type": "history_page", "data": data["data"]["tasks"]})
+
+        elif data["type"] == "new_task":
+            self.tasks.append(data["data"])
+            self.update_signal.emit({"type": "tasks", "data": self.tasks})
+            self.tray_icon.showMessage(
+                "New Task Assigned",
+                f"Task: {data['data']['description']}",
+                QSystemTrayIcon.MessageIcon.Information,
+                5000
+            )
+
+        elif data["type"] == "new_tasks":  # Bulk assignment, e.g. tasks reassigned by the admin
+            new_tasks = data["data"]["tasks"]
+            # Completed ones sit above the history cursor, so they'd never be paged in
+            self.history[:0] = [task for task in reversed(new_tasks) if task["status"] == "Completed"]
+            self.tasks.extend(task for task in new_tasks if task["status"] != "Completed")
+            self.update_signal.emit({"type": "tasks", "data": self.tasks})
+            self.update_signal.emit({"type": "history", "data": self.history})
+            self.tray_icon.showMessage(
+                "New Tasks Assigned",
+                f"{len(new_tasks)} task(s) were assigned to you",
+                QSystemTrayIcon.MessageIcon.Information,
+                5000
+            )
+
+        elif data["type"] == "task_update_admin":
+            self.apply_admin_updates([data["data"]])
+
+        elif data["type"] == "task_updates_admin":  # Bulk edit from the admin panel
+            self.apply_admin_updates(data["data"]["tasks"])
+
+        elif data["type"] == "delete_task":
+            self.remove_tasks([data["data"]["task_id"]])
+            self.update_signal.emit({"type": "tasks", "data": self.tasks})
+            self.update_signal.emit({"type": "history", "data": self.history})
+
+        elif data["type"] == "delete_tasks":  # Bulk removal, e.g. tasks moved to the archive
+            self.remove_tasks(data["data"]["task_ids"])
+            self.update_signal.emit({"type": "tasks", "data": self.tasks})
+            self.update_signal.emit({"type": "history", "data": self.history})
+
+        elif data["type"] == "new_notification":
+            self.notifications.append(data["data"])
+            self.notification_signal.emit([data["data"]])
+
+    def apply_admin_updates(self, updates):
+        """Replaces the local copies of tasks edited by the admin, looking each task_id up once."""
+        positions = {}
+        for task_list in (self.history, self.tasks):  # An id in both lists resolves to self.tasks
+            for i, task in enumerate(task_list):
+                if task["task_id"] is not None:
+                    positions[task["task_id"]] = (task_list, i)
+        reopened = False
+        for update in updates:
+            updated_task = {
+                "task_id": update["task_id"],
+                "uid": update.get("uid"),
+                "description": update["description"],
+                "due_date": update["due_date"],
+                "status": update["status"],
+            }
+            if updated_task["task_id"] in positions:
+                task_list, i = positions[updated_task["task_id"]]
+                task_list[i] = updated_task
+            else:
+                # A completed task that was never paged in was reopened by the admin
+                self.tasks.append(updated_task)
+                positions[updated_task["task_id"]] = (self.tasks, len(self.tasks) - 1)
+                reopened = True
+        if reopened:
+            self.tasks.sort(key=lambda task: task["task_id"])
+        self.update_signal.emit({"type": "tasks", "data": self.tasks})
+        self.update_signal.emit({"type": "history", "data": self.history})
+
+    def remove_tasks(self, task_ids):
+        """Drops tasks and shifts later task_ids down, mirroring the server's list removal."""
+        removed = sorted(task_ids)
+        removed_set = set(removed)
+        for task_list in (self.tasks, self.history):
+            task_list[:] = [task for task in task_list if task["task_id"] is None or task["task_id"] not in removed_set]
+            for task in task_list:
+                if task["task_id"] is not None:
+                    task["task_id"] -= bisect.bisect_left(removed, task["task_id"])
 
     def update_ui(self, update_data):
         if update_data["type"] == "tasks":
             self.task_list.clear()
-            for i, task in enumerate(update_data["data"]):
-                item = QListWidgetItem(
-                    f"Task {i}: {task['description']} (Due: {task['due_date']}, Status: {task['status']})"
-                )
-                item.setData(Qt.ItemDataRole.UserRole, i)
-                self.task_list.addItem(item)
+            for task in update_data["data"]:
+                self.task_list.addItem(self.task_item(task))
+            self.cache_timer.start()
+        elif update_data["type"] == "history":
+            self.history_list.clear()
+            for task in update_data["data"]:
+                self.history_list.addItem(self.task_item(task))
+            self.load_history_button.setEnabled(self.history_cursor is not None)
+        elif update_data["type"] == "history_page":
+            for task in update_data["data"]:  # Append only the new page
+                self.history_list.addItem(self.task_item(task))
+            self.load_history_button.setEnabled(self.history_cursor is not None)
         elif update_data["type"] == "notifications":
             self.notification_list.clear()
             for notification in update_data["data"]:
                 item = QListWidgetItem(f"{notification['message']} (Status: {notification['status']})")
                 self.notification_list.addItem(item)
+            self.cache_timer.start()
+        elif update_data["type"] == "outbox":
+            pending = len(self.outbox)
+            self.outbox_label.setText(f"Offline changes waiting to sync: {pending}" if pending else "")
+            self.outbox_label.setVisible(bool(pending))
+
+    def task_item(self, task):
+        label = f"Task {task['task_id']}" if task["task_id"] is not None else "Archived"
+        item = QListWidgetItem(
+            f"{label}: {task['description']} (Due: {task['due_date']}, Status: {task['status']})"
+        )
+        item.setData(Qt.ItemDataRole.UserRole, task["task_id"])
+        return item
 
     def mark_task_completed(self):
         selected_item = self.task_list.currentItem()
         if selected_item:
-            task_index = selected_item.data(Qt.ItemDataRole.UserRole)
-            if 0 <= task_index < len(self.tasks):
-                current_status = self.tasks[task_index]["status"]
+            task_id = selected_item.data(Qt.ItemDataRole.UserRole)
+            task = next((task for task in self.tasks if task["task_id"] == task_id), None)
+            if task is not None:
+                current_status = task["status"]
                 new_status = "Completed" if current_status != "Completed" else "In Progress"
-                self.tasks[task_index]["status"] = new_status
-                try:
-                    update_message = json.dumps({"task_update": {"task_id": task_index, "status": new_status}})
-                    self.client_socket.send(update_message.encode("utf-8"))
-                    self.update_ui({"type": "tasks", "data": self.tasks})
-                except Exception as e:
-                    print(f"Error sending task update: {e}")
-                    QMessageBox.critical(self, "Error", "Failed to send task update. Check server connection.")
+                task["status"] = new_status
+                # Queued rather than sent directly, so the change survives being offline or a restart
+                self.queue_operation({"task_update": {"task_id": task_id, "uid": task.get("uid"), "status": new_status}})
+                self.update_ui({"type": "tasks", "data": self.tasks})
             else:
-                print(f"Invalid task index: {task_index}")
-
-    def handle_notification(self, notification_data):
-        message = notification_data["message"]
+                print(f"Invalid task id: {task_id}")
+
+    def queue_notifications(self, new_notifications):
+        """Gathers notifications arriving within NOTIFICATION_BATCH_DELAY, e.g. reminders firing
+        together, so they get one popup, one list refresh and one read receipt."""
+        self.pending_notifications.extend(new_notifications)
+        if not self.notification_timer.isActive():  # Not restarted, so a steady stream still shows up
+            self.notification_timer.start()
+
+    def flush_notifications(self):
+        batch, self.pending_notifications = self.pending_notifications, []
+        if batch:
+            self.handle_notifications(batch)
+
+    def handle_notifications(self, new_notifications):
+        if len(new_notifications) == 1:
+            title, message = "New Notification", new_notifications[0]["message"]
+        else:
+            title = f"{len(new_notifications)} New Notifications"
+            message = "\n".join(n["message"] for n in new_notifications)
         # If the main window is not visible, show a modal popup
         if not self.isVisible():
-            QMessageBox.information(self, "New Notification", message)
+            QMessageBox.information(self, title, message)
         else:
             self.tray_icon.showMessage(
-                "New Notification",
+                title,
                 message,
                 QSystemTrayIcon.MessageIcon.Information,
                 5000  # Display for 5 seconds
             )
-        # Update the notification list in the UI.
+        # Update the notification list in the UI once for the whole batch.
         self.update_ui({"type": "notifications", "data": self.notifications})
-        # Mark the notification as read.
-        try:
-            read_message = json.dumps({"notification_read": notification_data["id"]})
-            self.client_socket.send(read_message.encode("utf-8"))
-        except Exception as e:
-            print(f"Error sending notification read receipt: {e}")
+        # Mark them as read with a single receipt.
+        self.queue_operation({"notifications_read": [n["id"] for n in new_notifications]})
 
     def tray_icon_activated(self, reason):
         if reason == QSystemTrayIcon.ActivationReason.Trigger:
@@ -322,6 +690,8 @@ class ClientGUI(QMainWindow):
             self.activateWindow()
 
     def close_application(self):
+        self.cache_timer.stop()
+        self.save_cache()
         self.connected = False
         if self.client_socket:
             try:
@@ -342,6 +712,10 @@ class ClientGUI(QMainWindow):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    client = ClientGUI("127.0.0.1", 5000)  # Adjust host/port as needed
+    config = read_json(CLIENT_CONFIG_FILE, {})
+    tls_context = client_tls_context(config.get("tls_ca_file", TLS_CERT_FILE)) if config.get("tls") else None
+    # "servers": ["host:port", ...] lists the primary first, then standbys to fail over to
+    endpoints = [(host, int(port)) for host, _, port in (server.rpartition(":") for server in config.get("servers", ["127.0.0.1:5000"]))]
+    client = ClientGUI(*endpoints[0], tls_context, standbys=endpoints[1:])
     client.show()
     sys.exit(app.exec())
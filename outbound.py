@@ -0,0 +1,200 @@
+import sys
+import json
+import time
+import socket
+import threading
+import itertools
+from collections import deque
+
+# --- Message Priorities ---
+PRIORITY_HIGH = 0  # Control traffic: acks, client removal
+PRIORITY_NORMAL = 1  # Incremental task and notification updates
+PRIORITY_LOW = 2  # Bulk payloads: initial sync, history pages
+PRIORITY_NAMES = ("high", "normal", "low")
+CHUNK_SIZE = 16 * 1024  # Characters per frame; larger messages are split so other lanes can interleave
+LATENCY_SAMPLES = 1000  # Recent samples kept per priority for percentiles
+
+_stats_lock = threading.Lock()
+_latencies = [deque(maxlen=LATENCY_SAMPLES) for _ in PRIORITY_NAMES]  # Seconds from enqueue to fully sent
+_counts = [0] * len(PRIORITY_NAMES)
+_max_latency = [0.0] * len(PRIORITY_NAMES)
+_stream_ids = itertools.count(1)
+
+
+class _Message:
+    __slots__ = ("message_type", "data", "seq", "enqueued", "frames")
+
+    def __init__(self, message_type, data, seq):
+        self.message_type = message_type
+        self.data = data
+        self.seq = seq
+        self.enqueued = time.perf_counter()
+        self.frames = None  # deque of encoded frames once the message has started sending
+
+
+def encode_frames(message_type, data, chunk_size=CHUNK_SIZE, seq=None):
+    """Encodes a message, tagged with its session sequence number if it has one, as newline-delimited frames.
+
+    Messages up to `chunk_size` characters are a single frame. Longer ones are
+    split into {"type": "chunk", "data": {"id", "part", "more"}} frames; the
+    receiver joins the parts of one id and decodes them once "more" is false.
+    """
+    message = {"type": message_type, "data": data}
+    if seq is not None:
+        message["seq"] = seq
+    text = json.dumps(message)
+    if len(text) <= chunk_size:
+        return deque([(text + "\n").encode("utf-8")])
+    stream_id = next(_stream_ids)
+    frames = deque()
+    for start in range(0, len(text), chunk_size):
+        chunk = {"id": stream_id, "part": text[start:start + chunk_size], "more": start + chunk_size < len(text)}
+        frames.append((json.dumps({"type": "chunk", "data": chunk}) + "\n").encode("utf-8"))
+    return frames
+
+
+class OutboundQueue:
+    """Prioritised outbound lanes for one client connection, drained by a writer thread.
+
+    The writer sends one frame at a time, always from the highest-priority lane
+    that has one, so a high-priority message waits for at most one frame of a
+    large message already in flight. Within a lane messages stay in order.
+
+    `data` may be a callable for bulk messages. It is called on the writer
+    thread when the message reaches the front of its lane, so a snapshot is
+    never older than the updates sent before it. Once a low-priority message has
+    started sending, normal-priority updates wait for it to finish, since they
+    apply on top of it. High-priority messages must not depend on that ordering.
+    `on_error` is called if the socket fails.
+    """
+
+    def __init__(self, sock, name, chunk_size=CHUNK_SIZE, on_error=None):
+        self.sock = sock
+        self.chunk_size = chunk_size
+        self.on_error = on_error
+        self._condition = threading.Condition()
+        self._lanes = [deque() for _ in PRIORITY_NAMES]
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"outbound-{name}", daemon=True)
+        self._thread.start()
+
+    def send(self, message_type, data, priority=PRIORITY_NORMAL, seq=None):
+        """Queues a message. Returns False if the connection is already closed."""
+        with self._condition:
+            if not self._running:
+                return False
+            self._lanes[priority].append(_Message(message_type, data, seq))
+            self._condition.notify()
+        return True
+
+    def pending(self):
+        """Returns the number of queued messages per lane."""
+        with self._condition:
+            return [len(lane) for lane in self._lanes]
+
+    def close(self, drain_timeout=0):
+        """Stops the writer and closes the socket, optionally waiting for queued messages first."""
+        deadline = time.monotonic() + drain_timeout
+        with self._condition:
+            while self._running and any(self._lanes) and time.monotonic() < deadline:
+                self._condition.wait(deadline - time.monotonic())
+            self._running = False
+            self._condition.notify_all()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _next_message(self):
+        """Returns (priority, message) to send a frame of next, or None when closed. Caller holds the lock."""
+        while self._running:
+            high, normal, low = self._lanes
+            if high:
+                return PRIORITY_HIGH, high[0]
+            if normal and not (low and low[0].frames is not None):  # Updates never split a snapshot
+                return PRIORITY_NORMAL, normal[0]
+            if low:
+                return PRIORITY_LOW, low[0]
+            self._condition.notify_all()  # Lanes are empty, wake up a draining close()
+            self._condition.wait()
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                selected = self._next_message()
+                if selected is None:
+                    return
+            priority, message = selected
+            try:
+                if message.frames is None:
+                    data = message.data() if callable(message.data) else message.data
+                    message.frames = encode_frames(message.message_type, data, self.chunk_size, message.seq)
+                self.sock.sendall(message.frames.popleft())
+            except Exception as e:
+                print(f"Error sending {message.message_type}: {e}")
+                with self._condition:
+                    self._running = False
+                    self._condition.notify_all()
+                if self.on_error is not None:
+                    self.on_error()
+                return
+            if not message.frames:
+                with self._condition:
+                    self._lanes[priority].popleft()
+                _record_latency(priority, time.perf_counter() - message.enqueued)
+
+
+def _record_latency(priority, seconds):
+    with _stats_lock:
+        _latencies[priority].append(seconds)
+        _counts[priority] += 1
+        _max_latency[priority] = max(_max_latency[priority], seconds)
+
+
+def latency_stats():
+    """Returns {priority name: {messages, avg_ms, p95_ms, max_ms}}, with avg/p95 over recent messages."""
+    stats = {}
+    with _stats_lock:
+        for priority, name in enumerate(PRIORITY_NAMES):
+            samples = sorted(_latencies[priority])
+            stats[name] = {
+                "messages": _counts[priority],
+                "avg_ms": sum(samples) / len(samples) * 1000 if samples else 0.0,
+                "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000 if samples else 0.0,
+                "max_ms": _max_latency[priority] * 1000,
+            }
+    return stats
+
+
+def _benchmark(task_count):
+    """Measures how long an ack waits behind an initial sync of `task_count` tasks."""
+    payload = {"tasks": [{"task_id": i, "description": f"Task {i} with a typical description",
+                          "due_date": "2024-01-01", "status": "Pending"} for i in range(task_count)]}
+    print(f"{task_count} tasks in initial_tasks")
+    for label, chunk_size in (("single frame", sys.maxsize), ("chunked", CHUNK_SIZE)):
+        server_sock, client_sock = socket.socketpair()
+        reader = client_sock.makefile("r", encoding="utf-8")
+        queue = OutboundQueue(server_sock, "benchmark", chunk_size)
+        queue.send("initial_tasks", payload, PRIORITY_LOW)
+        while not queue._lanes[PRIORITY_LOW] or queue._lanes[PRIORITY_LOW][0].frames is None:
+            time.sleep(0.001)  # Wait until the bulk message is on the wire
+        sent = time.perf_counter()
+        queue.send("ack", {"op_id": "x"}, PRIORITY_HIGH)
+        frames = 0
+        while True:
+            frames += 1
+            line = reader.readline()
+            if line.startswith('{"type": "ack"'):
+                break
+        print(f"  {label:<13} ack received after {(time.perf_counter() - sent) * 1000:8.2f} ms ({frames} frames read)")
+        while queue.pending()[PRIORITY_LOW]:
+            reader.readline()
+        queue.close()
+        client_sock.close()
+    print(latency_stats())
+
+
+if __name__ == "__main__":
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
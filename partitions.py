@@ -0,0 +1,266 @@
+import os
+import sys
+import time
+import zlib
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from persistence import SnapshotError, encode_snapshot, read_snapshot, write_snapshot
+from task_records import tasks_from_rows, tasks_to_rows
+
+PARTITION_DIR = "partitions"
+SHARD_COUNT = 256  # Fixed once data has been written, see PartitionedTasks
+MAX_RESIDENT_SHARDS = 64
+SHARD_IDLE_SECONDS = 600  # Shards untouched this long are evicted even below MAX_RESIDENT_SHARDS
+
+
+def shard_of(client_id, shard_count=SHARD_COUNT):
+    return zlib.crc32(client_id.encode("utf-8")) % shard_count
+
+
+class PartitionedTasks(MutableMapping):
+    """{client_id: [TaskRecord]} mapping whose data lives in per-shard snapshot files.
+
+    Clients are hashed into `shard_count` shards. A shard is read on first access
+    to any of its clients and kept in an LRU; beyond `max_resident` shards, or
+    after `idle_seconds` without access, shards are written back if changed and
+    dropped. Shards containing a client for which `is_active(client_id)` is true
+    (e.g. a connected client) are never evicted.
+
+    Iterating the mapping only visits resident shards, so memory stays bounded by
+    what is in use; `all_items()` walks every shard on disk. Changes are found at
+    `flush()` time by comparing a checksum of each resident shard's encoding with
+    the last one written, so callers can mutate the task lists in place. Pass
+    the lock that guards those mutations as `lock`, so that a shard can't be
+    evicted while another thread holding it is still working on one of its lists.
+    `on_evict(shard_tasks)`, if given, is called under the lock just before a
+    shard's {client_id: [TaskRecord]} is dropped.
+    """
+
+    def __init__(self, directory=PARTITION_DIR, shard_count=SHARD_COUNT, max_resident=MAX_RESIDENT_SHARDS,
+                 idle_seconds=SHARD_IDLE_SECONDS, is_active=None, lock=None, on_evict=None):
+        self.directory = directory
+        self.shard_count = shard_count
+        self.max_resident = max_resident
+        self.idle_seconds = idle_seconds
+        self.is_active = is_active or (lambda client_id: False)
+        self.on_evict = on_evict
+        self._lock = lock if lock is not None else threading.RLock()
+        self._shards = OrderedDict()  # {shard: {client_id: [TaskRecord]}}, least recently used first
+        self._last_used = {}  # {shard: monotonic time}
+        self._written_crc = {}  # {shard: crc32 of the encoding last read or written}
+        self._generation = {}  # {shard: number of times its file was written}, see cold_shards()
+        self.loads = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, shard):
+        return os.path.join(self.directory, f"tasks-{shard:04d}.snapshot")
+
+    def _encode(self, shard_tasks):
+        return encode_snapshot({"task_rows": tasks_to_rows(shard_tasks)})
+
+    def _shard(self, client_id):
+        """Returns the resident dict of the client's shard, loading it if needed. Caller holds the lock."""
+        shard = shard_of(client_id, self.shard_count)
+        shard_tasks = self._shards.get(shard)
+        if shard_tasks is None:
+            try:
+                shard_tasks = tasks_from_rows(read_snapshot(self._path(shard))["task_rows"])
+            except FileNotFoundError:
+                shard_tasks = {}
+            except (SnapshotError, KeyError) as e:
+                raise SnapshotError(f"task shard {shard} is unreadable: {e!r}")
+            self._written_crc[shard] = zlib.crc32(self._encode(shard_tasks))
+            self._shards[shard] = shard_tasks
+            self.loads += 1
+            self._evict(keep=shard)
+        else:
+            self._shards.move_to_end(shard)
+        self._last_used[shard] = time.monotonic()
+        return shard_tasks
+
+    # --- Mapping interface ---
+
+    def __getitem__(self, client_id):
+        with self._lock:
+            return self._shard(client_id)[client_id]
+
+    def __setitem__(self, client_id, task_list):
+        with self._lock:
+            self._shard(client_id)[client_id] = task_list
+
+    def __delitem__(self, client_id):
+        with self._lock:
+            del self._shard(client_id)[client_id]
+
+    def __contains__(self, client_id):
+        with self._lock:
+            return client_id in self._shard(client_id)
+
+    def __iter__(self):
+        """Iterates the clients of resident shards only."""
+        with self._lock:
+            client_ids = [client_id for shard_tasks in self._shards.values() for client_id in shard_tasks]
+        return iter(client_ids)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(shard_tasks) for shard_tasks in self._shards.values())
+
+    def resident_items(self):
+        """Returns (client_id, task list) of the loaded shards, without marking them as used."""
+        with self._lock:
+            return [item for shard_tasks in self._shards.values() for item in shard_tasks.items()]
+
+    def is_resident(self, shard):
+        return shard in self._shards
+
+    def generation(self, shard):
+        """Changes whenever the shard's file is written. Caller holds the lock."""
+        return self._generation.get(shard, 0)
+
+    def read_shard(self, shard):
+        """Returns a shard's {client_id: [TaskRecord]} from disk, without loading it into the LRU."""
+        try:
+            return tasks_from_rows(read_snapshot(self._path(shard))["task_rows"])
+        except FileNotFoundError:
+            return {}
+
+    def cold_shards(self):
+        """Yields (shard, generation, {client_id: [TaskRecord]}) for each shard that isn't loaded.
+
+        The lock is only held while one shard is read, so other threads keep going
+        in between. A shard that is loaded meanwhile is skipped; compare `generation()`
+        later to tell whether a yielded shard was written since it was read.
+        """
+        for shard in range(self.shard_count):
+            with self._lock:
+                if shard in self._shards:
+                    continue
+                generation = self.generation(shard)
+                shard_tasks = self.read_shard(shard)
+            yield shard, generation, shard_tasks
+
+    def write_cold_shard(self, shard, generation, shard_tasks):
+        """Replaces a shard that isn't loaded with `shard_tasks`, read by `cold_shards()` at `generation`.
+
+        Returns the number of bytes written, or None without writing if the shard was
+        loaded or written since, as those changes would be lost.
+        """
+        with self._lock:
+            if shard in self._shards or self.generation(shard) != generation:
+                return None
+            written = write_snapshot(self._path(shard), self._encode(shard_tasks))
+            self._generation[shard] = generation + 1
+            return written
+
+    def all_items(self):
+        """Yields (client_id, task list) for every client on disk, one shard at a time."""
+        for shard in range(self.shard_count):
+            with self._lock:
+                resident = shard in self._shards
+                if resident:
+                    items = list(self._shards[shard].items())
+                else:
+                    items = list(self.read_shard(shard).items())
+            yield from items
+
+    def import_tasks(self, all_tasks):
+        """Writes a full {client_id: [TaskRecord]} mapping out as shards, e.g. when migrating. Returns bytes written."""
+        by_shard = {}
+        for client_id, task_list in all_tasks.items():
+            by_shard.setdefault(shard_of(client_id, self.shard_count), {})[client_id] = task_list
+        written = 0
+        with self._lock:
+            self._shards.clear()
+            self._last_used.clear()
+            self._written_crc.clear()
+            for shard, shard_tasks in by_shard.items():
+                written += write_snapshot(self._path(shard), self._encode(shard_tasks))
+                self._generation[shard] = self.generation(shard) + 1
+        return written
+
+    # --- Persistence and eviction ---
+
+    def flush(self):
+        """Writes every resident shard that changed since it was read or last written. Returns bytes written."""
+        written = 0
+        with self._lock:
+            for shard, shard_tasks in self._shards.items():
+                written += self._write_if_changed(shard, shard_tasks)
+        return written
+
+    def _write_if_changed(self, shard, shard_tasks):
+        data = self._encode(shard_tasks)
+        checksum = zlib.crc32(data)
+        if checksum == self._written_crc.get(shard):
+            return 0
+        written = write_snapshot(self._path(shard), data)
+        self._written_crc[shard] = checksum
+        self._generation[shard] = self.generation(shard) + 1
+        return written
+
+    def _evictable(self, shard):
+        return not any(self.is_active(client_id) for client_id in self._shards[shard])
+
+    def _evict(self, keep=None, idle_only=False):
+        """Writes back and drops least recently used shards. Caller holds the lock."""
+        now = time.monotonic()
+        for shard in list(self._shards):
+            over_budget = len(self._shards) > self.max_resident
+            idle = now - self._last_used.get(shard, now) > self.idle_seconds
+            if not (idle or (over_budget and not idle_only)):
+                break  # The rest were used more recently
+            if shard == keep or not self._evictable(shard):
+                continue
+            if self.on_evict is not None:
+                self.on_evict(self._shards[shard])
+            self._write_if_changed(shard, self._shards[shard])
+            del self._shards[shard]
+            self._last_used.pop(shard, None)
+            self._written_crc.pop(shard, None)
+            self.evictions += 1
+
+    def evict_idle(self):
+        """Drops shards that have not been used for `idle_seconds`."""
+        with self._lock:
+            self._evict(idle_only=True)
+
+    def stats(self):
+        with self._lock:
+            return {"resident_shards": len(self._shards), "shard_count": self.shard_count,
+                    "resident_clients": sum(len(shard_tasks) for shard_tasks in self._shards.values()),
+                    "loads": self.loads, "evictions": self.evictions}
+
+
+def _benchmark(client_count):
+    """Compares startup plus one login against loading every client's tasks up front."""
+    import shutil
+    import tempfile
+    from task_records import TaskRecord
+
+    directory = tempfile.mkdtemp()
+    try:
+        all_tasks = {f"client{c}": [TaskRecord.create(f"Task {c}-{i}", "2024-01-01", uid=c * 100 + i) for i in range(20)]
+                     for c in range(client_count)}
+        PartitionedTasks(directory).import_tasks(all_tasks)
+        flat = os.path.join(directory, "flat.snapshot")
+        write_snapshot(flat, encode_snapshot({"task_rows": tasks_to_rows(all_tasks)}))
+        del all_tasks
+
+        start = time.perf_counter()
+        tasks_from_rows(read_snapshot(flat)["task_rows"])
+        print(f"{client_count} clients, 20 tasks each")
+        print(f"  load everything        {(time.perf_counter() - start) * 1000:8.1f} ms")
+        start = time.perf_counter()
+        partitioned = PartitionedTasks(directory)
+        partitioned["client0"]
+        print(f"  partitioned, 1 login   {(time.perf_counter() - start) * 1000:8.1f} ms  {partitioned.stats()}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
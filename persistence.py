@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import zlib
+import pickle
+import struct
+import tempfile
+import threading
+
+# --- Snapshot Format ---
+# header:  magic (6s) | version (B) | codec (B) | section count (H)
+# section: name length (H) | name | payload length (Q) | crc32 (I) | payload
+SNAPSHOT_MAGIC = b"TFSNAP"
+SNAPSHOT_VERSION = 1
+CODEC_JSON = 0
+CODEC_PICKLE = 1
+_HEADER = struct.Struct("<6sBBH")
+_SECTION_NAME = struct.Struct("<H")
+_SECTION_BODY = struct.Struct("<QI")
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is truncated, corrupt or of an unknown format."""
+
+
+def atomic_write(path, data):
+    """Writes bytes to `path` via a temp file in the same directory and an atomic rename."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        _fsync_directory(directory)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(data)
+
+
+def _fsync_directory(directory):
+    """Makes a rename durable on POSIX. Windows cannot open directories, so this is skipped there."""
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def encode_snapshot(sections, codec=CODEC_PICKLE):
+    """Encodes {name: object} into checksummed, length-prefixed snapshot bytes."""
+    parts = [_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, codec, len(sections))]
+    for name, value in sections.items():
+        if codec == CODEC_PICKLE:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            payload = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        encoded_name = name.encode("utf-8")
+        parts.append(_SECTION_NAME.pack(len(encoded_name)))
+        parts.append(encoded_name)
+        parts.append(_SECTION_BODY.pack(len(payload), zlib.crc32(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def decode_snapshot(data):
+    """Decodes snapshot bytes back into {name: object}, verifying every section checksum."""
+    view = memoryview(data)
+    if len(view) < _HEADER.size:
+        raise SnapshotError("snapshot is truncated")
+    magic, version, codec, count = _HEADER.unpack_from(view, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or codec not in (CODEC_JSON, CODEC_PICKLE):
+        raise SnapshotError("not a TaskFlow snapshot or unsupported version")
+    offset = _HEADER.size
+    sections = {}
+    try:
+        for _ in range(count):
+            (name_length,) = _SECTION_NAME.unpack_from(view, offset)
+            offset += _SECTION_NAME.size
+            name = bytes(view[offset:offset + name_length]).decode("utf-8")
+            offset += name_length
+            length, checksum = _SECTION_BODY.unpack_from(view, offset)
+            offset += _SECTION_BODY.size
+            payload = view[offset:offset + length]
+            offset += length
+            if len(payload) != length or zlib.crc32(payload) != checksum:
+                raise SnapshotError(f"checksum mismatch in section '{name}'")
+            if codec == CODEC_PICKLE:
+                sections[name] = pickle.loads(payload)
+            else:
+                sections[name] = json.loads(bytes(payload))
+    except struct.error:
+        raise SnapshotError("snapshot is truncated")
+    return sections
+
+
+def write_snapshot(path, data):
+    """Atomically replaces the snapshot at `path` with encoded `data`, keeping the previous one as `path`.bak."""
+    if os.path.exists(path):
+        os.replace(path, path + ".bak")
+    return atomic_write(path, data)
+
+
+def read_snapshot(path):
+    """Loads the snapshot at `path`, falling back to `path`.bak if it is missing or corrupt.
+
+    Raises FileNotFoundError if neither exists and SnapshotError if both are unreadable.
+    """
+    error = None
+    for candidate in (path, path + ".bak"):
+        try:
+            with open(candidate, "rb") as file:
+                return decode_snapshot(file.read())
+        except FileNotFoundError:
+            continue
+        except SnapshotError as e:
+            print(f"Snapshot {candidate} is unreadable: {e}")
+            error = e
+    if error is not None:
+        raise error
+    raise FileNotFoundError(path)
+
+
+class PersistenceScheduler:
+    """Coalesces save requests into at most one write per `max_delay` seconds.
+
+    `mark_dirty()` is cheap and can be called on every edit. A background thread
+    calls `write_fn` once the edits have been idle for `idle_delay` seconds, or
+    `max_delay` seconds after the first unsaved edit, whichever comes first.
+    `write_fn` must return the number of bytes it wrote. If it raises, the write
+    is retried after `retry_delay` seconds, doubling up to `max_retry_delay`
+    while it keeps failing.
+    """
+
+    def __init__(self, write_fn, max_delay=1.0, idle_delay=0.2, retry_delay=0.5, max_retry_delay=5.0):
+        self.write_fn = write_fn
+        self.max_delay = max_delay
+        self.idle_delay = idle_delay
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._dirty_since = None
+        self._last_mark = None
+        self._retry_at = None  # Set while writes are failing, no write is attempted before it
+        self._failures = 0
+        self._running = False
+        self._thread = None
+        self.marks = 0
+        self.flushes = 0
+        self.bytes_written = 0
+        self.last_flush_seconds = 0.0
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="persistence", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the background thread and writes any pending changes."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def mark_dirty(self):
+        with self._condition:
+            now = time.monotonic()
+            self.marks += 1
+            self._last_mark = now
+            if self._dirty_since is None:
+                self._dirty_since = now
+                self._condition.notify()
+            running = self._running
+            backing_off = self._retry_at is not None and now < self._retry_at
+        if not running and not backing_off:
+            self.flush()  # No background thread yet, write synchronously
+
+    def flush(self):
+        """Writes pending changes now, if there are any."""
+        with self._write_lock:
+            with self._condition:
+                if self._dirty_since is None:
+                    return
+                self._dirty_since = None
+            start = time.perf_counter()
+            try:
+                written = self.write_fn()
+            except Exception as e:
+                with self._condition:
+                    delay = min(self.retry_delay * 2 ** self._failures, self.max_retry_delay)
+                    self._failures += 1
+                    now = time.monotonic()
+                    self._retry_at = now + delay
+                    if self._dirty_since is None:
+                        self._dirty_since = now
+                print(f"Error saving data, will retry in {delay:g}s: {e}")
+                return
+            with self._condition:
+                self._retry_at = None
+                self._failures = 0
+            self.last_flush_seconds = time.perf_counter() - start
+            self.flushes += 1
+            self.bytes_written += written or 0
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and self._dirty_since is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                now = time.monotonic()
+                deadline = min(self._dirty_since + self.max_delay, self._last_mark + self.idle_delay)
+                if self._retry_at is not None:
+                    deadline = max(deadline, self._retry_at)
+                if now < deadline:
+                    self._condition.wait(deadline - now)
+                    continue
+            self.flush()
+
+    def stats(self):
+        """Returns write amplification counters (edits vs. physical writes)."""
+        return {
+            "edits": self.marks,
+            "writes": self.flushes,
+            "bytes_written": self.bytes_written,
+            "edits_per_write": self.marks / self.flushes if self.flushes else 0.0,
+            "bytes_per_edit": self.bytes_written / self.marks if self.marks else 0.0,
+            "last_write_ms": self.last_flush_seconds * 1000,
+        }
+
+
+def _benchmark(task_count):
+    """Compares cold-load time of the pretty-printed JSON files against a snapshot."""
+    clients_per_100 = max(1, task_count // 100)
+    tasks = {
+        f"client{c}": [
+            {"description": f"Task {c}-{i} with a typical description", "due_date": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+             "status": ("Pending", "In Progress", "Completed")[i % 3]}
+            for i in range(100)
+        ]
+        for c in range(clients_per_100)
+    }
+    sections = {"clients": {cid: {"ip": "127.0.0.1", "name": cid} for cid in tasks}, "tasks": tasks, "notifications": []}
+    json_bytes = json.dumps(tasks, indent=4).encode("utf-8")
+    print(f"{clients_per_100 * 100} tasks")
+    for label, encode, decode in (
+        ("json (indent=4)", lambda: json_bytes, lambda data: json.loads(data)),
+        ("snapshot/json", lambda: encode_snapshot(sections, CODEC_JSON), decode_snapshot),
+        ("snapshot/pickle", lambda: encode_snapshot(sections, CODEC_PICKLE), decode_snapshot),
+    ):
+        data = encode()
+        start = time.perf_counter()
+        decode(data)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<16} {len(data) / 1e6:8.2f} MB  load {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
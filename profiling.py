@@ -0,0 +1,173 @@
+import os
+import sys
+import time
+import signal
+import threading
+import functools
+from collections import Counter
+
+# --- Profiling Configuration ---
+PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+
+_lock = threading.Lock()
+_local = threading.local()
+_span_stacks = Counter()  # {"outer;inner": exclusive microseconds}
+_span_stats = {}  # {name: [count, total_seconds, max_seconds]}
+_samples = Counter()  # {"thread;frame;frame": sample count}
+_sampler_thread = None
+_sampler_stop = threading.Event()
+_toggle_requested = threading.Event()  # Set by the SIGUSR1 handler, see install_signal_handler
+_toggle_thread = None
+enabled = False
+
+
+class span:
+    """Times a block or function and records it under `name` while profiling is enabled."""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if enabled:
+            stack = getattr(_local, "stack", None)
+            if stack is None:
+                stack = _local.stack = []
+                _local.child_time = []
+            stack.append(self.name)
+            _local.child_time.append(0.0)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.start is None:
+            return False
+        elapsed = time.perf_counter() - self.start
+        stack = _local.stack
+        path = ";".join(stack)
+        stack.pop()
+        self_time = elapsed - _local.child_time.pop()  # Folded stacks expect exclusive time
+        if _local.child_time:
+            _local.child_time[-1] += elapsed
+        with _lock:
+            _span_stacks[path] += max(1, int(self_time * 1_000_000))
+            stats = _span_stats.setdefault(self.name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(self.name):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def _frame_stack(frame):
+    """Returns a root-first list of "function (file:line)" labels for a frame."""
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _sample_loop():
+    own_ident = threading.get_ident()
+    while not _sampler_stop.wait(SAMPLE_INTERVAL):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        frames = sys._current_frames()
+        with _lock:
+            for ident, frame in frames.items():
+                if ident == own_ident:
+                    continue
+                thread_name = names.get(ident, str(ident)).replace(";", ":")
+                _samples[";".join([thread_name] + _frame_stack(frame))] += 1
+
+
+def start():
+    """Enables timing spans and starts the background stack sampler."""
+    global enabled, _sampler_thread
+    with _lock:
+        _span_stacks.clear()
+        _span_stats.clear()
+        _samples.clear()
+    enabled = True
+    if _sampler_thread is None or not _sampler_thread.is_alive():
+        _sampler_stop.clear()
+        _sampler_thread = threading.Thread(target=_sample_loop, name="profiler", daemon=True)
+        _sampler_thread.start()
+    print("Profiling started.")
+
+
+def stop():
+    """Stops sampling, dumps the collected profile and returns the written file paths."""
+    global enabled, _sampler_thread
+    enabled = False
+    _sampler_stop.set()
+    if _sampler_thread is not None:
+        _sampler_thread.join(timeout=1)
+        _sampler_thread = None
+    paths = dump()
+    print(f"Profiling stopped. Output written to: {', '.join(paths)}")
+    return paths
+
+
+def toggle():
+    """Starts profiling if it is stopped, otherwise stops it and dumps the results."""
+    if enabled:
+        return stop()
+    start()
+    return []
+
+
+def dump():
+    """Writes samples and spans in collapsed-stack format (flamegraph.pl / speedscope compatible)."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    samples_path = os.path.join(PROFILE_DIR, f"samples-{stamp}.folded")
+    spans_path = os.path.join(PROFILE_DIR, f"spans-{stamp}.folded")
+    summary_path = os.path.join(PROFILE_DIR, f"spans-{stamp}.txt")
+    with _lock:
+        samples = dict(_samples)
+        span_stacks = dict(_span_stacks)
+        span_stats = {name: list(stats) for name, stats in _span_stats.items()}
+    with open(samples_path, "w") as file:
+        for stack, count in samples.items():
+            file.write(f"{stack} {count}\n")
+    with open(spans_path, "w") as file:  # Weights are in microseconds
+        for stack, micros in span_stacks.items():
+            file.write(f"{stack} {micros}\n")
+    with open(summary_path, "w") as file:
+        file.write(f"{'span':<40} {'calls':>8} {'total ms':>12} {'avg ms':>10} {'max ms':>10}\n")
+        for name, (count, total, longest) in sorted(span_stats.items(), key=lambda x: x[1][1], reverse=True):
+            file.write(f"{name:<40} {count:>8} {total * 1000:>12.2f} {total / count * 1000:>10.3f} {longest * 1000:>10.2f}\n")
+    return [samples_path, spans_path, summary_path]
+
+
+def _toggle_loop():
+    while True:
+        _toggle_requested.wait()
+        _toggle_requested.clear()
+        toggle()
+
+
+def install_signal_handler():
+    """Toggles profiling on SIGUSR1 (POSIX only). Must be called from the main thread.
+
+    The handler runs on the main thread, possibly inside a span that holds `_lock`,
+    so it only flags the request; a background thread does the toggle and the dump.
+    """
+    global _toggle_thread
+    if not hasattr(signal, "SIGUSR1"):
+        return
+    if _toggle_thread is None:
+        _toggle_thread = threading.Thread(target=_toggle_loop, name="profiler-toggle", daemon=True)
+        _toggle_thread.start()
+    signal.signal(signal.SIGUSR1, lambda signum, frame: _toggle_requested.set())
@@ -0,0 +1,261 @@
+import json
+import time
+import zlib
+import socket
+import threading
+
+from outbound import OutboundQueue, PRIORITY_HIGH, PRIORITY_NORMAL
+from transport import server_handshake, client_handshake
+
+HEARTBEAT_INTERVAL = 2  # Seconds between heartbeats from the primary to its standbys
+STANDBY_TIMEOUT = 3 * HEARTBEAT_INTERVAL  # A standby treats a primary silent this long as gone
+RECONNECT_DELAY = 2  # Seconds a standby waits before reconnecting to the primary
+
+
+class ChangeCapture:
+    """Finds the records that changed since the last capture.
+
+    Records are (key, JSON-serialisable value) pairs covering the replicated state.
+    Like PartitionedTasks.flush(), changes are found by comparing a checksum of each
+    record's encoding with the one last captured, so the state can be mutated in
+    place without logging every edit. A known key missing from the records is
+    reported as deleted (value None) if `complete(key)` is true; otherwise the
+    records are assumed to only cover part of the state.
+
+    Values are returned already encoded as JSON text, so they can be queued while
+    the state they were read from keeps changing.
+    """
+
+    def __init__(self):
+        self._crc = {}  # {key: crc32 of the last captured encoding}
+
+    def diff(self, records, complete=lambda key: True):
+        """Returns [[key, JSON text]] of the changed records, with None for deleted ones."""
+        changes = []
+        seen = set()
+        for key, value in records:
+            seen.add(key)
+            text = json.dumps(value)
+            checksum = zlib.crc32(text.encode("utf-8"))
+            if self._crc.get(key) != checksum:
+                self._crc[key] = checksum
+                changes.append([key, text])
+        for key in [key for key in self._crc if key not in seen and complete(key)]:
+            del self._crc[key]
+            changes.append([key, None])
+        return changes
+
+    def snapshot(self, records, encoded=()):
+        """Captures the full state afresh, for a snapshot sent to a new standby. Returns [[key, JSON text]].
+
+        `encoded` holds further (key, JSON text) records that were already encoded.
+        Later diff() calls only report what changed since, so the snapshot isn't sent
+        a second time as changes. Changes not yet diffed are lost to the capture, so
+        publish them to the other standbys first.
+        """
+        self._crc = {}
+        snapshot = [[key, json.dumps(value)] for key, value in records]
+        snapshot.extend([key, text] for key, text in encoded)
+        for key, text in snapshot:
+            self._crc[key] = zlib.crc32(text.encode("utf-8"))
+        return snapshot
+
+
+def decode_records(records):
+    return [(key, None if text is None else json.loads(text)) for key, text in records]
+
+
+def read_message(reader, chunks):
+    """Reads the next message from `reader`, joining chunked ones (see outbound.encode_frames). Returns None at EOF."""
+    while True:
+        line = reader.readline()
+        if not line:
+            return None
+        data = json.loads(line)
+        if data.get("type") != "chunk":
+            return data
+        chunk = data["data"]
+        chunks.setdefault(chunk["id"], []).append(chunk["part"])
+        if not chunk["more"]:
+            return json.loads("".join(chunks.pop(chunk["id"])))
+
+
+class ReplicationFeed:
+    """Primary side: streams changes to standby servers, numbered by a log sequence number (LSN).
+
+    A standby that connects is first sent a {"lsn", "records"} snapshot of the
+    [[key, JSON text]] records returned by `snapshot(prepared)`, then every batch
+    from ChangeCapture.diff() passed to `publish()` as "changes". Both run under
+    `lock`, the lock that guards the replicated state, so no batch can fall between
+    a snapshot and the first changes after it. `prepared` is the result of
+    `prepare_snapshot()`, if given, which runs before the lock is taken: use it to
+    read the parts of the state that are slow to read but cheap to check for
+    changes afterwards. Standbys acknowledge the LSN they applied, which `stats()`
+    reports as their lag.
+    """
+
+    def __init__(self, snapshot, lock, tls_context=None, prepare_snapshot=None):
+        self.snapshot = snapshot
+        self.prepare_snapshot = prepare_snapshot
+        self.tls_context = tls_context
+        self.lsn = 0
+        self._lock = lock
+        self._standbys = {}  # {OutboundQueue: {"address", "acked_lsn"}}
+        self._listener = None
+        self._closed = False
+
+    def serve(self, host, port):
+        """Accepts standby connections until the listener is closed. Blocks, run it on a thread."""
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((host, port))
+        self._listener.listen(5)
+        print(f"Replication feed listening on {host}:{port}")
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+        while True:
+            try:
+                sock, address = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle_standby, args=(sock, address), daemon=True).start()
+
+    def publish(self, changes):
+        """Sends a batch of changes to every standby. Caller holds the lock."""
+        if not changes:
+            return
+        self.lsn += 1
+        for queue in list(self._standbys):
+            queue.send("changes", {"lsn": self.lsn, "records": changes}, PRIORITY_NORMAL)
+
+    def has_standbys(self):
+        return bool(self._standbys)
+
+    def stats(self):
+        """Returns {"lsn", "standbys": [{"address", "acked_lsn", "lag"}]}."""
+        with self._lock:
+            return {"lsn": self.lsn, "standbys": [{**info, "lag": self.lsn - info["acked_lsn"]}
+                                                  for info in self._standbys.values()]}
+
+    def close(self):
+        self._closed = True
+        if self._listener is not None:
+            self._listener.close()
+        with self._lock:
+            standbys, self._standbys = list(self._standbys), {}
+        for queue in standbys:
+            queue.close()
+
+    def _handle_standby(self, sock, address):
+        queue = None
+        try:
+            if self.tls_context is not None:
+                sock = server_handshake(self.tls_context, sock)
+            reader = sock.makefile("r", encoding="utf-8")
+            prepared = self.prepare_snapshot() if self.prepare_snapshot is not None else None
+            with self._lock:
+                queue = OutboundQueue(sock, f"standby-{address[0]}:{address[1]}", on_error=lambda: self._drop(queue))
+                queue.send("snapshot", {"lsn": self.lsn, "records": self.snapshot(prepared)}, PRIORITY_NORMAL)
+                self._standbys[queue] = {"address": f"{address[0]}:{address[1]}", "acked_lsn": 0}
+            print(f"Standby {address[0]}:{address[1]} connected at LSN {self.lsn}")
+            for line in reader:
+                message = json.loads(line)
+                if message.get("type") == "ack":
+                    with self._lock:
+                        if queue in self._standbys:
+                            self._standbys[queue]["acked_lsn"] = message["lsn"]
+        except Exception as e:
+            print(f"Standby {address[0]}:{address[1]} error: {e}")
+        finally:
+            if queue is not None:
+                self._drop(queue)
+            print(f"Standby {address[0]}:{address[1]} disconnected")
+
+    def _drop(self, queue):
+        with self._lock:
+            self._standbys.pop(queue, None)
+        queue.close()
+
+    def _heartbeat_loop(self):
+        while not self._closed:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                for queue in list(self._standbys):
+                    queue.send("heartbeat", {"lsn": self.lsn}, PRIORITY_HIGH)
+
+
+class ReplicationFollower:
+    """Standby side: keeps local state in sync with a primary's ReplicationFeed.
+
+    `apply(records, full)` is called on the follower thread with each snapshot
+    (full=True) and batch of changes. If a batch is missing, or the connection
+    fails or stays silent for STANDBY_TIMEOUT, the follower reconnects and starts
+    over from a new snapshot. `last_contact` is the monotonic time the primary was
+    last heard from.
+    """
+
+    def __init__(self, host, port, apply, tls_context=None):
+        self.host = host
+        self.port = port
+        self.apply = apply
+        self.tls_context = tls_context
+        self.lsn = None  # LSN of the last applied snapshot or batch, None before the first snapshot
+        self.connected = False
+        self.last_contact = time.monotonic()
+        self._running = True
+        self._sock = None
+        self._thread = threading.Thread(target=self._run, name="replication-follower", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while self._running:
+            try:
+                self._follow()
+            except Exception as e:
+                if self._running:
+                    print(f"Replication from {self.host}:{self.port} interrupted: {e}")
+            self.connected = False
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+            if self._running:
+                time.sleep(RECONNECT_DELAY)
+
+    def _follow(self):
+        sock = socket.create_connection((self.host, self.port), timeout=STANDBY_TIMEOUT)
+        if self.tls_context is not None:
+            sock = client_handshake(self.tls_context, sock, self.host)
+        self._sock = sock
+        sock.settimeout(STANDBY_TIMEOUT)  # Heartbeats arrive more often than this
+        reader = sock.makefile("r", encoding="utf-8")
+        chunks = {}
+        lsn = None
+        while self._running:
+            message = read_message(reader, chunks)
+            if message is None:
+                raise ConnectionResetError("Primary closed the connection")
+            self.last_contact = time.monotonic()
+            if message["type"] == "snapshot":
+                self.apply(decode_records(message["data"]["records"]), True)
+                lsn = message["data"]["lsn"]
+                self.connected = True
+            elif message["type"] == "changes":
+                if lsn is None or message["data"]["lsn"] != lsn + 1:
+                    raise ValueError(f"expected LSN {None if lsn is None else lsn + 1}, got {message['data']['lsn']}")
+                self.apply(decode_records(message["data"]["records"]), False)
+                lsn = message["data"]["lsn"]
+            else:
+                continue  # Heartbeat
+            self.lsn = lsn
+            sock.sendall((json.dumps({"type": "ack", "lsn": lsn}) + "\n").encode("utf-8"))
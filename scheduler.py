@@ -0,0 +1,245 @@
+import json
+import time
+import heapq
+import sqlite3
+import threading
+
+from persistence import PersistenceScheduler
+
+
+class Job:
+    __slots__ = ("job_id", "fire_at", "kind", "payload", "key")
+
+    def __init__(self, job_id, fire_at, kind, payload, key=None):
+        self.job_id = job_id
+        self.fire_at = fire_at
+        self.kind = kind
+        self.payload = payload
+        self.key = key
+
+    def to_dict(self):
+        return {"id": self.job_id, "fire_at": self.fire_at, "kind": self.kind, "payload": self.payload, "key": self.key}
+
+
+class Scheduler:
+    """Persistent timer queue backed by a binary heap.
+
+    Each tick only looks at the top of the heap, so the cost of a pending timer is
+    O(log n) to add and nothing while it waits. Cancelled or rescheduled jobs are
+    dropped lazily when they reach the top. `handler(job)` runs on the scheduler
+    thread; returning a timestamp reschedules the job (recurring jobs), returning
+    None removes it. Jobs are saved to the SQLite database `path` and due jobs fire
+    on the next start if the server was down when they were due. Adding a job with
+    the `key` of a pending job replaces that job.
+
+    Only the jobs added, changed or removed since the last write are saved, in one
+    coalesced transaction, so a write costs the same with ten or a million pending
+    timers. A `legacy_path` schedule.json from older versions is imported by load().
+    """
+
+    def __init__(self, handler, path="schedule.db", legacy_path=None):
+        self.handler = handler
+        self.path = path
+        self.legacy_path = legacy_path
+        self._condition = threading.Condition()
+        self._heap = []  # [(fire_at, job_id)]
+        self._jobs = {}  # {job_id: Job}
+        self._keys = {}  # {key: job_id}
+        self._changes = {}  # {job_id: Job, or None if removed} not written yet
+        self._clear_saved = False  # Set by clear(): delete every saved job on the next write
+        self._next_id = 1
+        self._running = False
+        self._thread = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)  # Only used by load() and _write()
+        self._conn.executescript('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            fire_at REAL NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT,
+            key TEXT
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            name TEXT PRIMARY KEY,
+            value INTEGER
+        );
+        ''')
+        self._conn.commit()
+        self._persistence = PersistenceScheduler(self._write, max_delay=2.0, idle_delay=0.5)
+
+    def load(self):
+        """Loads saved jobs. Returns False if there was no saved schedule yet."""
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'next_id'").fetchone()
+        if row is None:
+            return self._import_legacy()
+        jobs = [Job(job_id, fire_at, kind, json.loads(payload), key)
+                for job_id, fire_at, kind, payload, key in self._conn.execute("SELECT id, fire_at, kind, payload, key FROM jobs")]
+        self._restore(row[0], jobs)
+        return True
+
+    def _import_legacy(self):
+        try:
+            with open(self.legacy_path, "r") as file:
+                saved = json.load(file)
+        except (TypeError, FileNotFoundError):  # No legacy path, or no file there
+            return False
+        jobs = [Job(data["id"], data["fire_at"], data["kind"], data["payload"], data.get("key")) for data in saved["jobs"]]
+        self._restore(saved["next_id"], jobs)
+        with self._condition:
+            self._changes = dict(self._jobs)
+        self._write()  # The JSON file is left in place as a backup
+        print(f"Imported {len(jobs)} scheduled jobs from {self.legacy_path}")
+        return True
+
+    def _restore(self, next_id, jobs):
+        with self._condition:
+            self._next_id = next_id
+            for job in jobs:
+                self._jobs[job.job_id] = job
+                if job.key is not None:
+                    self._keys[job.key] = job.job_id
+            self._heap = [(job.fire_at, job.job_id) for job in self._jobs.values()]
+            heapq.heapify(self._heap)
+
+    def _write(self):
+        """Saves the changes since the last write. Runs on the persistence thread, see PersistenceScheduler."""
+        with self._condition:  # Only the changes are encoded under the lock, not every job
+            changes, self._changes = self._changes, {}
+            clear, self._clear_saved = self._clear_saved, False
+            next_id = self._next_id
+            upserts = [(job.job_id, job.fire_at, job.kind, json.dumps(job.payload), job.key)
+                       for job in changes.values() if job is not None]
+            deletes = [(job_id,) for job_id, job in changes.items() if job is None]
+        try:
+            with self._conn:
+                if clear:
+                    self._conn.execute("DELETE FROM jobs")
+                self._conn.executemany("DELETE FROM jobs WHERE id = ?", deletes)
+                self._conn.executemany("INSERT OR REPLACE INTO jobs (id, fire_at, kind, payload, key) VALUES (?, ?, ?, ?, ?)",
+                                       upserts)
+                self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('next_id', ?)", (next_id,))
+        except sqlite3.Error:
+            with self._condition:  # Keep the changes for the retry, unless newer ones replaced them
+                for job_id, job in changes.items():
+                    self._changes.setdefault(job_id, job)
+                self._clear_saved = self._clear_saved or clear
+            raise
+        return sum(len(row[3]) + 32 for row in upserts) + 8 * len(deletes)
+
+    def clear(self):
+        """Drops every job, including saved ones that weren't loaded."""
+        with self._condition:
+            self._jobs.clear()
+            self._keys.clear()
+            self._heap.clear()
+            self._changes.clear()
+            self._clear_saved = True
+        self._persistence.mark_dirty()
+
+    def start(self):
+        with self._condition:
+            self._running = True
+        self._persistence.start()
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._persistence.stop()
+        self._conn.close()
+
+    def add(self, fire_at, kind, payload, key=None):
+        """Schedules a job at the epoch timestamp `fire_at`. Returns its id."""
+        with self._condition:
+            if key is not None and key in self._keys:
+                replaced_id = self._keys[key]
+                self._jobs.pop(replaced_id, None)
+                self._changes[replaced_id] = None
+                self._compact()
+            job = Job(self._next_id, fire_at, kind, payload, key)
+            self._next_id += 1
+            self._jobs[job.job_id] = job
+            self._changes[job.job_id] = job
+            if key is not None:
+                self._keys[key] = job.job_id
+            heapq.heappush(self._heap, (fire_at, job.job_id))
+            if self._heap[0][1] == job.job_id:
+                self._condition.notify()  # New earliest deadline
+        self._persistence.mark_dirty()
+        return job.job_id
+
+    def cancel(self, job_id):
+        with self._condition:
+            job = self._jobs.pop(job_id, None)
+            removed = job is not None
+            if removed:
+                self._changes[job_id] = None
+                if job.key is not None:
+                    self._keys.pop(job.key, None)
+            self._compact()
+        if removed:
+            self._persistence.mark_dirty()
+        return removed
+
+    def _compact(self):
+        """Rebuilds the heap once more than half of its entries are stale. Caller holds the lock."""
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._jobs):
+            self._heap = [(job.fire_at, job.job_id) for job in self._jobs.values()]
+            heapq.heapify(self._heap)
+
+    def jobs(self, kind=None):
+        """Returns a list of pending jobs, optionally only those of one kind."""
+        with self._condition:
+            return [job for job in self._jobs.values() if kind is None or job.kind == kind]
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _next_due_job(self):
+        """Blocks until a job is due and returns it, or returns None when stopped."""
+        with self._condition:
+            while self._running:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                fire_at, job_id = self._heap[0]
+                job = self._jobs.get(job_id)
+                if job is None or job.fire_at != fire_at:
+                    heapq.heappop(self._heap)  # Cancelled or rescheduled
+                    continue
+                delay = fire_at - time.time()
+                if delay > 0:
+                    self._condition.wait(min(delay, 60))  # Re-check regularly in case the clock jumps
+                    continue
+                heapq.heappop(self._heap)
+                return job
+        return None
+
+    def _run(self):
+        while True:
+            job = self._next_due_job()
+            if job is None:
+                return
+            try:
+                next_fire = self.handler(job)
+            except Exception as e:
+                print(f"Scheduled job {job.job_id} ({job.kind}) failed: {e}")
+                next_fire = None
+            with self._condition:
+                if job.job_id not in self._jobs:
+                    continue  # Cancelled while running
+                if next_fire is None:
+                    del self._jobs[job.job_id]
+                    if job.key is not None and self._keys.get(job.key) == job.job_id:
+                        del self._keys[job.key]
+                    self._changes[job.job_id] = None
+                else:
+                    job.fire_at = next_fire
+                    heapq.heappush(self._heap, (next_fire, job.job_id))
+                    self._changes[job.job_id] = job
+            self._persistence.mark_dirty()
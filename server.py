@@ -1,25 +1,84 @@
+import os
 import sys
 import json
 import socket
+import itertools
 import threading
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QLabel, QVBoxLayout, QWidget,
     QTextEdit, QTableWidget, QTableWidgetItem, QComboBox, QMessageBox,
-    QLineEdit, QTabWidget, QHBoxLayout, QDialog, QFormLayout
+    QLineEdit, QTabWidget, QHBoxLayout, QDialog, QFormLayout, QFileDialog
 )
-from PyQt6.QtCore import Qt, QDateTime, QTimer
+from PyQt6.QtCore import Qt, QDateTime, QTimer, QItemSelection, QItemSelectionModel
 from PyQt6.QtGui import QAction, QIcon
+import time
+import datetime
+import profiling
+from collections import OrderedDict
+from archive import ArchiveStore, estimate_size
+from analytics import TaskAnalytics
+from scheduler import Scheduler
+from sessions import SessionCache, SESSION_TTL
+from partitions import PartitionedTasks, PARTITION_DIR, SHARD_COUNT, MAX_RESIDENT_SHARDS, SHARD_IDLE_SECONDS
+from task_records import (TaskRecord, TaskStatus, STATUS_LABELS, OPEN_STATUSES, tasks_from_json, tasks_to_json,
+                          tasks_from_rows, tasks_to_rows)
+from outbound import OutboundQueue, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, latency_stats
+from transport import server_tls_context, client_tls_context, server_handshake, TLS_CERT_FILE, TLS_KEY_FILE
+from replication import ChangeCapture, ReplicationFeed, ReplicationFollower
+from persistence import PersistenceScheduler, SnapshotError, atomic_write, encode_snapshot, read_snapshot, write_snapshot
 
 # --- Server & Admin Panel Configuration ---
 DEFAULT_HOST = "127.0.0.1"
 DEFAULT_PORT = 5000
 CONFIG_FILE = "server_config.json"
-
-clients = {}
-tasks = {}
+SNAPSHOT_FILE = "taskflow.snapshot"
+PARTITION_INDEX_FILE = os.path.join(PARTITION_DIR, "global.snapshot")  # Clients, notifications and id counters
+PARTITION_EVICT_INTERVAL = 60  # Seconds between checks for idle task shards
+HISTORY_PAGE_SIZE = 50  # Completed tasks per history page
+MAX_HISTORY_PAGE_SIZE = 500
+ARCHIVE_FILE = "archive.db"
+ARCHIVE_AFTER_DAYS = 30  # Default age before completed tasks / read notifications are archived
+ARCHIVE_INTERVAL = 3600  # Default seconds between archival runs
+SCHEDULE_FILE = "schedule.db"
+LEGACY_SCHEDULE_FILE = "schedule.json"  # Imported into SCHEDULE_FILE on first start
+ANALYTICS_FILE = "analytics.json"  # Analytics counters in JSON storage; the other formats keep them with the data
+REMINDER_LEAD_HOURS = 24  # Default hours before the end of the due date that a reminder is sent
+RECURRENCE_DAYS = {"Daily": 1, "Weekly": 7}
+SAVE_MAX_DELAY = 1.0  # Seconds an edit may wait before it is written to disk
+SAVE_IDLE_DELAY = 0.2  # Write early once edits have been quiet this long
+MESSAGE_PRIORITIES = {  # Outbound lane per message type, PRIORITY_NORMAL if not listed
+    "ack": PRIORITY_HIGH,
+    "client_removed": PRIORITY_HIGH,
+    "initial_tasks": PRIORITY_LOW,
+    "initial_notifications": PRIORITY_LOW,
+    "history_page": PRIORITY_LOW,
+    "session": PRIORITY_LOW,  # Follows the initial sync, see handle_client
+}
+PROCESSED_OPS_PER_CLIENT = 1000  # Recent client operation ids remembered to drop replayed duplicates
+TASK_UID_ROLE = Qt.ItemDataRole.UserRole + 1  # Task table: uid of the row's task
+
+clients = {}  # {client_id: OutboundQueue of the live connection}
+tasks = {}  # {client_id: [TaskRecord]}, a PartitionedTasks in partitioned storage
 client_data = {}
 notifications = []
 next_notification_id = 1
+next_task_uid = 1
+data_lock = threading.RLock()  # Guards clients/tasks/notifications against concurrent writers
+archive_store = None  # ArchiveStore, opened at startup
+scheduler = None  # Scheduler for reminders, overdue checks and recurring tasks, started at startup
+reminder_lead_hours = REMINDER_LEAD_HOURS
+processed_ops = {}  # {client_id: OrderedDict of recently applied op_ids}
+sessions = SessionCache()  # Resumable client sessions, see handle_client
+archive_requested = threading.Event()
+last_archive_report = None
+storage_format = "json"  # "json" (clients/tasks/notifications.json), "snapshot" (SNAPSHOT_FILE) or "partitioned" (PARTITION_DIR)
+tls_context = None  # ssl.SSLContext when the "tls" option is on, plaintext otherwise
+replication_feed = None  # ReplicationFeed of a primary with "replication_port" set
+replication_follower = None  # ReplicationFollower while this server is a standby ("standby_of")
+replication_capture = ChangeCapture()
+replicated_recurring = []  # Recurring jobs received as a standby, scheduled on promotion
+promotion_lock = threading.Lock()
+analytics = TaskAnalytics()  # Completion metrics per client and week, updated with every task change
 
 
 def load_server_config():
@@ -33,117 +92,893 @@ def load_server_config():
 
 def save_server_config(host, port):
     """Saves server IP and port to config file."""
-    config = {"host": host, "port": port}
+    config = load_config_file()
+    config.update({"host": host, "port": port})
     with open(CONFIG_FILE, "w") as file:
         json.dump(config, file, indent=4)
 
-def load_data():
-    global client_data, tasks, notifications, next_notification_id
+def load_config_file():
+    """Returns the raw server config dict, or an empty dict if there is none yet."""
+    try:
+        with open(CONFIG_FILE, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+def load_json_data():
+    """Loads the legacy JSON data files. Returns (client_data, tasks, notifications)."""
     try:
         with open("clients.json", "r") as file:
-            client_data = json.load(file)
+            loaded_clients = json.load(file)
     except FileNotFoundError:
-        client_data = {}
+        loaded_clients = {}
     try:
         with open("tasks.json", "r") as file:
-            tasks = json.load(file)
+            loaded_tasks = json.load(file)
     except FileNotFoundError:
-        tasks = {}
+        loaded_tasks = {}
     try:
         with open("notifications.json", "r") as file:
-            notifications = json.load(file)
-            if notifications:
-                next_notification_id = max(n["id"] for n in notifications) + 1
+            loaded_notifications = json.load(file)
     except FileNotFoundError:
-        notifications = []
+        loaded_notifications = []
+    return loaded_clients, loaded_tasks, loaded_notifications
 
+def load_json_analytics():
+    try:
+        with open(ANALYTICS_FILE, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
 
+def open_task_partitions(shard_count):
+    config = load_config_file()
+    return PartitionedTasks(PARTITION_DIR, shard_count,
+                            max_resident=config.get("max_resident_shards", MAX_RESIDENT_SHARDS),
+                            idle_seconds=config.get("shard_idle_seconds", SHARD_IDLE_SECONDS),
+                            is_active=lambda client_id: client_id in clients, lock=data_lock,
+                            on_evict=lambda shard_tasks: publish_changes(shard_tasks.items()))
 
-def save_data():
-    with open("clients.json", "w") as file:
-        json.dump(client_data, file, indent=4)
-    with open("tasks.json", "w") as file:
-        json.dump(tasks, file, indent=4)
-    with open("notifications.json", "w") as file:
-        json.dump(notifications, file, indent=4)
-
-def send_update_to_client(client_id, update_type, data):
-    """Sends an update to a specific client."""
-    if client_id in clients:
+def load_data():
+    global client_data, tasks, notifications, next_notification_id, next_task_uid
+    archived_notification_id, archived_task_uid = archive_store.max_ids() if archive_store else (0, 0)
+    if storage_format == "partitioned":
         try:
-            message = json.dumps({"type": update_type, "data": data})
-            clients[client_id].send(message.encode("utf-8"))
-        except Exception as e:
-            print(f"Error sending update to {client_id}: {e}")
-            remove_client_connection(client_id)
+            index = read_snapshot(PARTITION_INDEX_FILE)
+        except FileNotFoundError:
+            index = None  # First start with partitioned storage, migrate below
+        if index is not None:
+            # Task shards are only read when one of their clients is first used
+            try:
+                client_data, notifications, counters = index["clients"], index["notifications"], index["counters"]
+            except KeyError as e:
+                raise SnapshotError(f"{PARTITION_INDEX_FILE} has no {e} section")
+            tasks = open_task_partitions(counters["shard_count"])
+            next_notification_id = max(counters["next_notification_id"], archived_notification_id + 1)
+            next_task_uid = max(counters["next_task_uid"], archived_task_uid + 1)
+            load_analytics(index.get("analytics"))
+            return
+    if storage_format == "snapshot" or (storage_format == "partitioned" and os.path.exists(SNAPSHOT_FILE)):
+        try:
+            snapshot = read_snapshot(SNAPSHOT_FILE)
+            client_data, notifications = snapshot["clients"], snapshot["notifications"]
+            saved_analytics = snapshot.get("analytics")
+            if "task_rows" in snapshot:
+                tasks = tasks_from_rows(snapshot["task_rows"])
+            else:  # Snapshot written before tasks were stored as compact rows
+                tasks = tasks_from_json(snapshot["tasks"])
+        except KeyError as e:
+            raise SnapshotError(f"{SNAPSHOT_FILE} has no {e} section")
+        except FileNotFoundError:
+            # First start in snapshot mode: migrate from the JSON files. They are left in place as a
+            # backup. A snapshot that exists but can't be read is not a first start, see start-up.
+            print("No snapshot yet, loading JSON data files instead.")
+            client_data, tasks, notifications = load_json_data()
+            tasks = tasks_from_json(tasks)
+            saved_analytics = load_json_analytics()
+            if storage_format == "snapshot":
+                save_data()
+    else:
+        client_data, tasks, notifications = load_json_data()
+        tasks = tasks_from_json(tasks)
+        saved_analytics = load_json_analytics()
+    next_notification_id = max([n["id"] for n in notifications] + [archived_notification_id]) + 1
+    next_task_uid = max([task.uid or 0 for task_list in tasks.values() for task in task_list] + [archived_task_uid]) + 1
+    for task_list in tasks.values():
+        for task in task_list:
+            if task.uid is None:  # Tasks saved before uids existed
+                task.uid = next_task_uid
+                next_task_uid += 1
+    if storage_format == "partitioned":
+        # The flat files are left in place as a backup
+        print(f"Migrating {sum(len(task_list) for task_list in tasks.values())} tasks to partitioned storage.")
+        flat_tasks = tasks
+        tasks = open_task_partitions(load_config_file().get("partition_shards", SHARD_COUNT))
+        tasks.import_tasks(flat_tasks)
+        save_data()
+    load_analytics(saved_analytics)
+
+def all_task_items():
+    """Yields (client_id, task list) for every client, including ones whose task shard isn't loaded."""
+    return tasks.all_items() if isinstance(tasks, PartitionedTasks) else tasks.items()
+
+def resident_task_items():
+    """Returns (client_id, task list) of the clients in memory. Unlike tasks.items(), this doesn't
+    count as using their task shards, so it can't keep idle shards from being evicted."""
+    return tasks.resident_items() if isinstance(tasks, PartitionedTasks) else list(tasks.items())
+
+def load_analytics(saved):
+    """Restores saved analytics counters, or counts them from scratch if there are none yet."""
+    if saved is not None:
+        analytics.load(saved)
+    else:
+        print(f"No saved analytics, counted {rebuild_analytics()} tasks.")
+
+def rebuild_analytics():
+    """Recounts the analytics from every task, in memory, on disk and archived. Returns the number of tasks.
+
+    This reads the whole dataset, so it only runs when there are no saved counters or on request.
+    Archived tasks of removed clients stay in the archive but, as with removal, aren't counted.
+    """
+    archived = ((client_id, [task]) for client_id, task in archive_store.iter_tasks()
+                if client_id in client_data) if archive_store else ()
+    with data_lock:
+        count = analytics.rebuild(itertools.chain(all_task_items(), archived))
+    save_data()
+    return count
+
+
+@profiling.span("write_data")
+def write_data():
+    """Atomically writes all data files. Returns the number of bytes written."""
+    with data_lock:
+        # Standbys get the changes at the same coalesced pace as the disk
+        publish_changes(resident_task_items())
+    if storage_format == "snapshot":
+        with data_lock:
+            data = encode_snapshot({"clients": client_data, "task_rows": tasks_to_rows(tasks), "notifications": notifications,
+                                    "analytics": analytics.to_dict()})
+        return write_snapshot(SNAPSHOT_FILE, data)
+    if storage_format == "partitioned":
+        with data_lock:
+            written = tasks.flush()  # Only the task shards that changed
+            counters = {"shard_count": tasks.shard_count, "next_task_uid": next_task_uid,
+                        "next_notification_id": next_notification_id}
+            index = encode_snapshot({"clients": client_data, "notifications": notifications, "counters": counters,
+                                     "analytics": analytics.to_dict()})
+        return written + write_snapshot(PARTITION_INDEX_FILE, index)
+    with data_lock:
+        payloads = {
+            "clients.json": json.dumps(client_data, indent=4),
+            "tasks.json": json.dumps(tasks_to_json(tasks), indent=4),
+            "notifications.json": json.dumps(notifications, indent=4),
+            ANALYTICS_FILE: json.dumps(analytics.to_dict(), indent=4),
+        }
+    return sum(atomic_write(path, payload.encode("utf-8")) for path, payload in payloads.items())
+
+# --- Replication ---
+
+def replication_records(task_items):
+    """Yields the (key, value) records of the replicated state, with the tasks of `task_items`. Caller holds data_lock."""
+    yield "clients", client_data
+    yield "counters", {"next_task_uid": next_task_uid, "next_notification_id": next_notification_id}
+    if scheduler is not None:
+        yield "recurring", [job.to_dict() for job in sorted(scheduler.jobs("recurring"), key=lambda job: job.job_id)]
+    else:
+        yield "recurring", replicated_recurring
+    for notification in notifications:
+        yield f"notification:{notification['id']}", notification
+    for client_id in analytics.client_ids():  # Counters cover archived tasks too, which standbys don't have
+        yield f"analytics:{client_id}", analytics.client_counters(client_id)
+    for client_id, task_list in task_items:
+        yield f"task:{client_id}", [task.to_row() for task in task_list]
+
+def replicated_key_deleted(key):
+    """Whether a key missing from replication_records() was deleted, rather than in a task shard that isn't loaded."""
+    kind, _, client_id = key.partition(":")
+    return kind != "task" or client_id not in client_data
+
+def publish_changes(task_items):
+    """Sends the records changed since the last capture to the standbys. Caller holds data_lock.
+
+    Nothing is captured while no standby is connected; a standby that connects gets a full snapshot anyway.
+    """
+    if replication_feed is not None and replication_feed.has_standbys():
+        replication_feed.publish(replication_capture.diff(replication_records(task_items), replicated_key_deleted))
+
+def task_records_of(shard_tasks):
+    """Encodes a {client_id: [TaskRecord]} shard as (key, JSON text) records, see replication_records()."""
+    return [(f"task:{client_id}", json.dumps([task.to_row() for task in task_list]))
+            for client_id, task_list in shard_tasks.items()]
+
+def prepare_replication_snapshot():
+    """ReplicationFeed callback, before data_lock is taken: reads and encodes the task shards that aren't loaded.
+
+    Returns {shard: (generation, records)}; replication_snapshot() checks that they are still current.
+    """
+    if not isinstance(tasks, PartitionedTasks):
+        return {}
+    return {shard: (generation, task_records_of(shard_tasks)) for shard, generation, shard_tasks in tasks.cold_shards()}
+
+def replication_snapshot(cold_shards):
+    """ReplicationFeed callback, under data_lock: the full state for a connecting standby, as [[key, JSON text]].
+
+    The change capture is reseeded with it, so the next publish only carries what
+    changed since. The standbys already connected are first sent what changed up
+    to now, as the reseed forgets it.
+    """
+    publish_changes(resident_task_items())
+    encoded = []
+    if isinstance(tasks, PartitionedTasks):
+        for shard in range(tasks.shard_count):
+            if tasks.is_resident(shard):
+                continue  # Part of the resident records below
+            generation, records = cold_shards.get(shard, (None, None))
+            if generation != tasks.generation(shard):  # Loaded, changed and evicted since it was read
+                records = task_records_of(tasks.read_shard(shard))
+            encoded.extend(records)
+    return replication_capture.snapshot(replication_records(resident_task_items()), encoded)
+
+def apply_replicated(records, full):
+    """ReplicationFollower callback: applies a snapshot (`full`) or a batch of changes from the primary."""
+    global next_task_uid, next_notification_id, replicated_recurring
+    with data_lock:
+        by_id = {} if full else {n["id"]: n for n in notifications}
+        stale_clients = {client_id for client_id, _ in all_task_items()} if full else set()
+        if full:
+            analytics.load({})
+        for key, value in records:
+            kind, _, name = key.partition(":")
+            if kind == "clients":
+                client_data.clear()
+                client_data.update(value)
+            elif kind == "counters":
+                next_task_uid = value["next_task_uid"]
+                next_notification_id = value["next_notification_id"]
+            elif kind == "recurring":
+                replicated_recurring = value
+            elif kind == "analytics":
+                analytics.set_client(name, value)
+            elif kind == "notification":
+                if value is None:
+                    by_id.pop(int(name), None)
+                else:
+                    by_id[value["id"]] = value
+            elif kind == "task":
+                stale_clients.discard(name)
+                if value is None:
+                    tasks.pop(name, None)
+                else:
+                    tasks[name] = [TaskRecord.from_row(row) for row in value]
+        for client_id in stale_clients:  # Not in the snapshot, so gone on the primary
+            del tasks[client_id]
+        notifications[:] = sorted(by_id.values(), key=lambda n: n["id"])
+    save_data()
+
+def start_primary_services(host, port, promoted=False):
+    """Starts what only the primary runs: timers, archival, the replication feed and the client listener."""
+    global scheduler, replication_feed
+    threading.Thread(target=archive_loop, daemon=True).start()
+    scheduler = Scheduler(run_scheduled_job, SCHEDULE_FILE, LEGACY_SCHEDULE_FILE)
+    if promoted:
+        # The local schedule is older than the replicated data, rebuild it from that instead
+        scheduler.clear()
+        rebuild_timers = True
+    else:
+        rebuild_timers = not scheduler.load()  # First start with the scheduler
+    # Started before the timers are added, so they are saved in coalesced batches rather than one write each
+    scheduler.start()
+    if promoted:
+        for job in replicated_recurring:
+            scheduler.add(job["fire_at"], job["kind"], job["payload"], key=job["key"])
+    if rebuild_timers:
+        for client_id, task_list in all_task_items():
+            for task in task_list:
+                # Reminders the old primary may already have sent aren't repeated
+                schedule_task_timers(client_id, task, new_due_date=not promoted)
+    replication_port = load_config_file().get("replication_port")
+    if replication_port:
+        replication_feed = ReplicationFeed(replication_snapshot, data_lock, tls_context, prepare_replication_snapshot)
+        threading.Thread(target=replication_feed.serve, args=(host, replication_port), daemon=True).start()
+    threading.Thread(target=start_server, args=(host, port), daemon=True).start()
+
+def promote_to_primary(host, port):
+    """Turns this standby into the primary, e.g. once the old one is gone. Returns False if it isn't a standby."""
+    global replication_follower
+    with promotion_lock:
+        follower, replication_follower = replication_follower, None
+    if follower is None:
+        return False
+    follower.stop()
+    print(f"Promoted to primary at LSN {follower.lsn}")
+    start_primary_services(host, port, promoted=True)
+    return True
+
+def standby_watchdog(host, port, promote_after):
+    """Promotes this standby once a primary it has synced with has been silent for `promote_after` seconds."""
+    while True:
+        time.sleep(1)
+        follower = replication_follower
+        if follower is None:
+            return
+        if follower.lsn is not None and time.monotonic() - follower.last_contact > promote_after:
+            print(f"Primary {follower.host}:{follower.port} unreachable for {promote_after} s")
+            promote_to_primary(host, port)
+            return
+
+persistence = PersistenceScheduler(write_data, max_delay=SAVE_MAX_DELAY, idle_delay=SAVE_IDLE_DELAY)
+
+@profiling.span("save_data")
+def save_data():
+    """Marks data as changed; the persistence scheduler coalesces the actual write."""
+    persistence.mark_dirty()
+
+@profiling.span("send_update_to_client")
+def send_update_to_client(client_id, update_type, data, priority=None):
+    """Queues an update for a specific client on the lane of its MESSAGE_PRIORITIES class.
+
+    `data` may be a function returning the payload; it is then built just before sending.
+    """
+    if priority is None:
+        priority = MESSAGE_PRIORITIES.get(update_type, PRIORITY_NORMAL)
+    with data_lock:  # Sequence numbers must reach the connection in order
+        # Incremental updates are numbered and kept in the client's session, even while it is
+        # disconnected, so a resuming client can be sent just the ones it missed
+        seq = sessions.record(client_id, update_type, data) if priority == PRIORITY_NORMAL else None
+        connection = clients.get(client_id)
+        if connection is not None:
+            connection.send(update_type, data, priority, seq)
     window.handle_client_update(update_type, data)  # Notify the admin panel of the update
 
-def remove_client_connection(client_id):
-    """Safely removes a client's connection."""
-    if client_id in clients:
+def notification_recipients(client_id):
+    """Returns the clients a notification for `client_id` (or "ALL") must be delivered to."""
+    if client_id == "ALL":
+        return set(clients) | set(sessions.client_ids())  # Including ones that may resume their session
+    return [client_id]
+
+def remove_client_connection(client_id, connection=None, drain_timeout=0):
+    """Safely removes a client's connection.
+
+    If `connection` is given, only that connection is closed, so a stale one
+    can't drop a newer connection of the same client.
+    """
+    current = clients.get(client_id)
+    if connection is not None and connection is not current:
+        connection.close()
+        return
+    if current is not None:
         try:
-            clients[client_id].close()
+            current.close(drain_timeout)
         except:
             pass
-        del clients[client_id]
-        print(f"Client {client_id} disconnected.")
-
-def handle_client(client_socket, client_address):
-    """Handles communication with a connected client."""
-    global next_notification_id
+        if clients.get(client_id) is current:  # The reader thread may have removed it while draining
+            del clients[client_id]
+            print(f"Client {client_id} disconnected.")
+
+def get_open_tasks(client_id):
+    """Returns the client's tasks that are not completed, tagged with their task_id."""
+    return [task.to_wire(i) for i, task in enumerate(tasks.get(client_id, [])) if task.status != TaskStatus.COMPLETED]
+
+def initial_tasks_payload(client_id):
+    """Open tasks (completed ones are fetched page by page on demand) and the first history cursor."""
+    with data_lock:
+        return {"tasks": get_open_tasks(client_id), "history_cursor": f"h:{len(tasks.get(client_id, []))}"}
+
+def initial_notifications_payload(client_id):
+    with data_lock:
+        return [n for n in notifications if n["client_id"] in (client_id, "ALL") and n["status"] == "unread"]
+
+def history_page_payload(client_id, cursor, limit):
+    with data_lock:
+        page, next_cursor = get_history_page(client_id, cursor, limit)
+    return {"cursor": cursor, "tasks": page, "next_cursor": next_cursor}
+
+def get_history_page(client_id, cursor, limit=HISTORY_PAGE_SIZE):
+    """Returns (completed tasks newest first, next cursor) starting below `cursor`.
+
+    Cursors are opaque strings: "h:<task index>" pages through the completed tasks
+    still in `tasks`, then "a:<archive row id>" continues with archived ones (which
+    have no task_id). The next cursor is None once the history is exhausted.
+    """
+    kind, _, position = (cursor or "h:").partition(":")
+    if kind == "a":
+        if archive_store is None:
+            return [], None
+        page, next_id = archive_store.task_page(client_id, int(position) if position else None, limit)
+        return [{"task_id": None, **task} for task in page], (f"a:{next_id}" if next_id is not None else None)
+
+    client_tasks = tasks.get(client_id, [])
     try:
-        client_id = client_socket.recv(1024).decode("utf-8")
-        if client_id not in client_data:
-            # Send invalid ID message before closing
-            error_msg = json.dumps({"type": "invalid_id"})
-            client_socket.send(error_msg.encode("utf-8"))
-            client_socket.close()
-            return
+        position = min(int(position), len(client_tasks))
+    except ValueError:
+        position = len(client_tasks)
+    page = []
+    while position > 0 and len(page) < limit:
+        position -= 1
+        task = client_tasks[position]
+        if task.status == TaskStatus.COMPLETED:
+            page.append(task.to_wire(position))
+    if position > 0 and len(page) == limit:
+        return page, f"h:{position}"
+    return page, "a:"  # Continue with archived tasks
+
+def find_task(client_id, uid):
+    """Returns (task_id, TaskRecord) for a task uid, or (None, None). Caller holds data_lock."""
+    for task_id, task in enumerate(tasks.get(client_id, [])):
+        if task.uid == uid:
+            return task_id, task
+    return None, None
+
+def set_task_status(client_id, task, status):
+    """Changes a task's status, stamping its completion time and updating the analytics. Caller holds data_lock."""
+    analytics.remove(client_id, task)
+    task.set_status(status)
+    analytics.add(client_id, task)
+
+def add_task(client_id, description, due_date):
+    """Creates a task, schedules its reminders and sends it to the client. Returns the TaskRecord."""
+    global next_task_uid
+    with data_lock:
+        new_task = TaskRecord.create(description, due_date, uid=next_task_uid, created=int(time.time()))
+        next_task_uid += 1
+        analytics.add(client_id, new_task)
+        if client_id not in tasks:
+            tasks[client_id] = []
+        tasks[client_id].append(new_task)
+        task_id = len(tasks[client_id]) - 1
+    save_data()
+    schedule_task_timers(client_id, new_task)
+    send_update_to_client(client_id, "new_task", new_task.to_wire(task_id)) # Send task with ID
+    return new_task
+
+def resolve_selection(selection):
+    """Turns {client_id: [(task_index, uid)]} from the admin table into {client_id: sorted task indices}.
+
+    Entries whose index no longer points at the same task (the list changed since
+    the table was built) are dropped. Caller holds data_lock.
+    """
+    resolved = {}
+    for client_id, entries in selection.items():
+        task_list = tasks.get(client_id)
+        if not task_list:
+            continue
+        indices = sorted({i for i, uid in entries if 0 <= i < len(task_list) and task_list[i].uid == uid})
+        if indices:
+            resolved[client_id] = indices
+    return resolved
+
+def remove_task_indices(task_list, indices):
+    """Removes the tasks at `indices` in one pass. Returns them in order."""
+    drop = set(indices)
+    removed = [task_list[i] for i in indices]
+    task_list[:] = [task for i, task in enumerate(task_list) if i not in drop]
+    return removed
+
+def bulk_update_tasks(selection, status=None, shift_days=0):
+    """Sets the status of the selected tasks and/or moves their due dates by `shift_days`.
+
+    Everything is saved at once and each client gets a single task_updates_admin
+    message. Free-text due dates can't be shifted. Returns the number of tasks changed.
+    Raises ValueError, without changing anything, if a shifted due date would be out of range.
+    """
+    updates = {}  # {client_id: [(task_index, TaskRecord)]}
+    with data_lock:
+        resolved = resolve_selection(selection)
+        if shift_days:
+            last_day = datetime.date.max.toordinal()
+            for client_id, indices in resolved.items():
+                task_list = tasks[client_id]
+                if any(0 < task_list[i].due and not 1 <= task_list[i].due + shift_days <= last_day for i in indices):
+                    raise ValueError(f"Shifting by {shift_days} days would move a due date out of range.")
+        for client_id, indices in resolved.items():
+            task_list = tasks[client_id]
+            for i in indices:
+                task = task_list[i]
+                shifted = bool(shift_days) and task.due > 0
+                if not shifted and status is None:
+                    continue
+                analytics.remove(client_id, task)
+                if shifted:
+                    task.due += shift_days
+                if status is not None:
+                    task.set_status(status)
+                analytics.add(client_id, task)
+                updates.setdefault(client_id, []).append((i, task))
+        wire = {client_id: [task.to_wire(i) for i, task in changed] for client_id, changed in updates.items()}
+    if not updates:
+        return 0
+    save_data()
+    for client_id, changed in updates.items():
+        for _, task in changed:
+            schedule_task_timers(client_id, task, new_due_date=bool(shift_days))
+        send_update_to_client(client_id, "task_updates_admin", {"tasks": wire[client_id]})
+    return sum(len(changed) for changed in updates.values())
+
+def bulk_delete_tasks(selection):
+    """Deletes the selected tasks with one save and one delete_tasks message per client. Returns the count."""
+    removed = {}
+    with data_lock:
+        for client_id, indices in resolve_selection(selection).items():
+            for task in remove_task_indices(tasks[client_id], indices):
+                analytics.remove(client_id, task)
+            removed[client_id] = indices
+    if removed:
+        save_data()
+    for client_id, indices in removed.items():
+        send_update_to_client(client_id, "delete_tasks", {"task_ids": indices})
+    return sum(len(indices) for indices in removed.values())
+
+def bulk_reassign_tasks(selection, target_client):
+    """Moves the selected tasks to the end of another client's list. Returns the number moved.
+
+    Sources get one delete_tasks message each and the target one new_tasks message;
+    uids stay the same, so pending reminders follow the tasks.
+    """
+    removed = {}
+    moved = []
+    with data_lock:
+        resolved = resolve_selection(selection)
+        resolved.pop(target_client, None)  # Already there
+        for client_id, indices in resolved.items():
+            for task in remove_task_indices(tasks[client_id], indices):
+                analytics.remove(client_id, task)
+                moved.append(task)
+            removed[client_id] = indices
+        if moved:
+            target_list = tasks.setdefault(target_client, [])
+            first_id = len(target_list)
+            target_list.extend(moved)
+            for task in moved:
+                analytics.add(target_client, task)
+            wire = [task.to_wire(first_id + n) for n, task in enumerate(moved)]
+    if not moved:
+        return 0
+    save_data()
+    for client_id, indices in removed.items():
+        send_update_to_client(client_id, "delete_tasks", {"task_ids": indices})
+    for task in moved:
+        schedule_task_timers(target_client, task, new_due_date=False)
+    send_update_to_client(target_client, "new_tasks", {"tasks": wire})
+    return len(moved)
+
+def post_notification(client_id, message):
+    """Stores a notification for a client (or "ALL") and delivers it to connected clients."""
+    global next_notification_id
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with data_lock:
+        notification = {
+            "id": next_notification_id,
+            "client_id": client_id,
+            "message": message,
+            "status": "unread",
+            "timestamp": timestamp,
+            "read_timestamp": None  # Will be set when read
+        }
+        notifications.append(notification)
+        next_notification_id += 1
+    save_data()
+
+    # **Send notification to the appropriate client(s)**
+    for cid in notification_recipients(client_id):
+        send_update_to_client(cid, "new_notification", notification)
+    return notification
+
+def due_deadline(task):
+    """Epoch timestamp of the end of the task's due date, or None if it has no valid due date."""
+    if task.due <= 0:
+        return None
+    return datetime.datetime.combine(datetime.date.fromordinal(task.due + 1), datetime.time()).timestamp()
+
+def schedule_task_timers(client_id, task, new_due_date=True):
+    """(Re)schedules the reminder and overdue timers of an open task.
+
+    For a new task or due date whose reminder time has already passed, the reminder
+    is sent right away; otherwise (e.g. a status change) a passed reminder is not repeated.
+    """
+    deadline = due_deadline(task)
+    if scheduler is None or deadline is None or task.status not in OPEN_STATUSES:
+        return
+    payload = {"client_id": client_id, "uid": task.uid, "due": task.due}
+    now = time.time()
+    remind_at = deadline - reminder_lead_hours * 3600
+    if remind_at > now or (new_due_date and deadline > now):
+        scheduler.add(max(remind_at, now), "reminder", payload, key=f"reminder:{task.uid}")
+    scheduler.add(deadline, "overdue", payload, key=f"overdue:{task.uid}")
+
+def add_recurring_task(client_id, description, interval_days, due_in_days):
+    """Adds a template that assigns a new task to a client (or "ALL") every `interval_days`."""
+    payload = {"client_id": client_id, "description": description,
+               "interval_days": interval_days, "due_in_days": due_in_days}
+    job_id = scheduler.add(time.time(), "recurring", payload)
+    save_data()  # Recurring templates are replicated along with the data
+    return job_id
+
+def run_scheduled_job(job):
+    """Scheduler callback. Returns the next fire time for recurring jobs."""
+    payload = job.payload
+    if job.kind in ("reminder", "overdue"):
+        with data_lock:
+            task_id, task = find_task(payload["client_id"], payload["uid"])
+            # Skip timers of tasks that were deleted, finished or moved to another date meanwhile
+            if task is None or task.status not in OPEN_STATUSES or task.due != payload["due"]:
+                return None
+            if job.kind == "overdue":
+                set_task_status(payload["client_id"], task, TaskStatus.OVERDUE)
+        if job.kind == "reminder":
+            post_notification(payload["client_id"], f"Reminder: '{task.description}' is due on {task.due_date}.")
+        else:
+            save_data()
+            send_update_to_client(payload["client_id"], "task_update_admin", task.to_wire(task_id))
+        return None
 
-        clients[client_id] = client_socket
-        print(f"Client {client_id} connected from {client_address}")
+    if job.kind == "recurring":
+        due_date = (datetime.date.today() + datetime.timedelta(days=payload["due_in_days"])).isoformat()
+        targets = list(client_data) if payload["client_id"] == "ALL" else [payload["client_id"]]
+        for client_id in targets:
+            if client_id in client_data:
+                add_task(client_id, payload["description"], due_date)
+        interval = payload["interval_days"] * 86400
+        next_fire = job.fire_at + interval
+        while next_fire <= time.time():  # Don't replay every run missed while the server was down
+            next_fire += interval
+        return next_fire
+    return None
+
+def _older_than(date_text, cutoff):
+    """True if a "YYYY-MM-DD[ HH:MM:SS]" string lies before the cutoff date."""
+    try:
+        return datetime.date.fromisoformat(date_text[:10]) < cutoff
+    except (TypeError, ValueError):
+        return False
+
+@profiling.span("run_archival")
+def run_archival(max_age_days):
+    """Moves old completed tasks and read notifications from memory into the archive.
+
+    Candidates are collected under data_lock, written to the archive without holding
+    it, and then removed from the hot structures in a second short critical section.
+    Anything edited in between stays hot and its archive copy is dropped again.
+    With partitioned storage, shards that aren't loaded are read from disk one at a
+    time and rewritten without their archived tasks, unless they were loaded or
+    written in between. Returns a report dict.
+    """
+    global last_archive_report
+    cutoff = datetime.date.today() - datetime.timedelta(days=max_age_days)
+
+    def archivable(task):
+        return task.status == TaskStatus.COMPLETED and 0 < task.due < cutoff.toordinal()
+
+    with data_lock:
+        task_candidates = [(client_id, task) for client_id, task_list in resident_task_items() for task in task_list
+                           if archivable(task)]
+        notification_candidates = [n for n in notifications
+                                   if n["status"] == "read" and _older_than(n.get("read_timestamp"), cutoff)]
+        task_snapshots = [(client_id, task.to_dict()) for client_id, task in task_candidates]
+        notification_snapshots = [dict(n) for n in notification_candidates]
+    cold_candidates = []  # [(shard, generation, {client_id: [TaskRecord]}, [(client_id, task)])]
+    if isinstance(tasks, PartitionedTasks):
+        for shard, generation, shard_tasks in tasks.cold_shards():
+            old = [(client_id, task) for client_id, task_list in shard_tasks.items() for task in task_list
+                   if archivable(task)]
+            if old:
+                cold_candidates.append((shard, generation, shard_tasks, old))
+    cold_snapshots = [(client_id, task.to_dict()) for *_, old in cold_candidates for client_id, task in old]
+
+    row_ids = archive_store.add_tasks(task_snapshots + cold_snapshots)
+    row_ids, cold_row_ids = row_ids[:len(task_snapshots)], iter(row_ids[len(task_snapshots):])
+    archive_store.add_notifications(notification_snapshots)
+
+    removed_indices = {}  # {client_id: [task_id, ...]}
+    stale_row_ids = []
+    reclaimed = 0
+    with data_lock:
+        archived = {}  # {client_id: {id(task): archive row id}}
+        for (client_id, task), (_, snapshot), row_id in zip(task_candidates, task_snapshots, row_ids):
+            if task.to_dict() == snapshot:
+                archived.setdefault(client_id, {})[id(task)] = row_id
+            else:
+                stale_row_ids.append(row_id)
+        for client_id, row_by_task in archived.items():
+            task_list = tasks.get(client_id, [])
+            removed_indices[client_id] = [i for i, task in enumerate(task_list) if id(task) in row_by_task]
+            # Tasks that are gone from the list meanwhile (deleted, or their shard was evicted and reloaded)
+            found = {id(task_list[i]) for i in removed_indices[client_id]}
+            stale_row_ids.extend(row_id for task_id, row_id in row_by_task.items() if task_id not in found)
+            reclaimed += sum(estimate_size(task_list[i]) for i in removed_indices[client_id])
+            task_list[:] = [task for task in task_list if id(task) not in found]
+        archived_notifications = {id(n) for n, snapshot in zip(notification_candidates, notification_snapshots)
+                                  if n == snapshot}
+        stale_notification_ids = [snapshot["id"] for n, snapshot in zip(notification_candidates, notification_snapshots)
+                                  if n != snapshot]
+        reclaimed += sum(estimate_size(n) for n in notifications if id(n) in archived_notifications)
+        notifications[:] = [n for n in notifications if id(n) not in archived_notifications]
+    for shard, generation, shard_tasks, old in cold_candidates:
+        shard_row_ids = [next(cold_row_ids) for _ in old]
+        drop = {id(task) for _, task in old}
+        shard_indices = {client_id: [i for i, task in enumerate(task_list) if id(task) in drop]
+                         for client_id, task_list in shard_tasks.items()}
+        for task_list in shard_tasks.values():
+            task_list[:] = [task for task in task_list if id(task) not in drop]
+        with data_lock:  # One shard at a time, like cold_shards()
+            if tasks.write_cold_shard(shard, generation, shard_tasks) is None:
+                stale_row_ids.extend(shard_row_ids)  # Loaded or written meanwhile, left for the next run
+                continue
+            publish_changes(shard_tasks.items())
+        removed_indices.update((client_id, indices) for client_id, indices in shard_indices.items() if indices)
+    archive_store.delete_tasks(stale_row_ids)
+    archive_store.delete_notifications(stale_notification_ids)
+
+    task_count = sum(len(indices) for indices in removed_indices.values())
+    if task_count or archived_notifications:
+        save_data()
+    for client_id, indices in removed_indices.items():
+        if indices:
+            send_update_to_client(client_id, "delete_tasks", {"task_ids": indices})
+
+    last_archive_report = {
+        "finished": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "tasks": task_count,
+        "notifications": len(archived_notifications),
+        "reclaimed_bytes": reclaimed,
+    }
+    print(f"Archival: moved {task_count} tasks and {len(archived_notifications)} notifications, "
+          f"reclaimed ~{reclaimed / 1024:.1f} KiB")
+    return last_archive_report
+
+def archive_loop():
+    """Background job that runs archival every `archive_interval` seconds or when requested."""
+    while True:
+        config = load_config_file()
+        archive_requested.wait(config.get("archive_interval", ARCHIVE_INTERVAL))
+        archive_requested.clear()
+        try:
+            run_archival(config.get("archive_after_days", ARCHIVE_AFTER_DAYS))
+        except Exception as e:
+            print(f"Archival failed: {e}")
 
-        # Send initial tasks and unread notifications
-        client_tasks = tasks.get(client_id, [])
-        print(f"Sending tasks to {client_id}: {client_tasks}")  # ✅ Debugging line
-        send_update_to_client(client_id, "initial_tasks", client_tasks)
+def partition_eviction_loop():
+    """Periodically writes back and unloads task shards that have been idle."""
+    while True:
+        time.sleep(PARTITION_EVICT_INTERVAL)
+        try:
+            tasks.evict_idle()
+        except Exception as e:
+            print(f"Partition eviction failed: {e}")
+
+@profiling.span("handle_client.dispatch")
+def dispatch_client_message(client_id, data):
+    """Applies one message received from a client."""
+    if "task_update" in data:
+        task_update = data["task_update"]
+        task_id = task_update["task_id"]  # Now expecting a *task_id*
+        status = TaskStatus.parse(task_update["status"])
+        with data_lock:
+            if task_update.get("uid") is not None:
+                # Queued offline updates name the task by uid, its index may have shifted since
+                task_id, _ = find_task(client_id, task_update["uid"])
+            if task_id is not None and client_id in tasks and 0 <= task_id < len(tasks[client_id]):
+                set_task_status(client_id, tasks[client_id][task_id], status)
+                save_data()
+                schedule_task_timers(client_id, tasks[client_id][task_id], new_due_date=False)
+                print(f"Task {task_id} for client {client_id} updated to {status.label}")
+
+    elif "notifications_read" in data:
+        mark_notifications_read(client_id, data["notifications_read"])
+
+    elif "notification_read" in data:  # Single receipt, as sent by older clients
+        mark_notifications_read(client_id, [data["notification_read"]])
+
+    elif "history_request" in data:
+        request = data["history_request"]
+        limit = max(1, min(int(request.get("limit", HISTORY_PAGE_SIZE)), MAX_HISTORY_PAGE_SIZE))
+        cursor = request.get("cursor")
+        send_update_to_client(client_id, "history_page", lambda: history_page_payload(client_id, cursor, limit))
+
+def mark_notifications_read(client_id, notification_ids):
+    """Marks a batch of the client's notifications as read in one pass and one save."""
+    pending = set(notification_ids)
+    if not pending:
+        return
+    read_timestamp = QDateTime.currentDateTime().toString("yyyy-MM-dd HH:mm:ss")
+    with data_lock:
+        marked = 0
+        for notification in notifications:
+            if notification["id"] in pending and notification["client_id"] == client_id:
+                notification["status"] = "read"
+                notification["read_timestamp"] = read_timestamp
+                pending.discard(notification["id"])
+                marked += 1
+                if not pending:
+                    break
+        if marked:
+            save_data()
 
-        unread_notifications = [n for n in notifications if n["client_id"] in (client_id, "ALL") and n["status"] == "unread"]
-        send_update_to_client(client_id, "initial_notifications", unread_notifications)
+def op_already_applied(client_id, op_id):
+    return op_id in processed_ops.get(client_id, ())
+
+def remember_op(client_id, op_id):
+    """Records an applied operation id so a replay after reconnect is acknowledged but not re-applied."""
+    with data_lock:
+        recent = processed_ops.setdefault(client_id, OrderedDict())
+        recent[op_id] = None
+        recent.move_to_end(op_id)
+        while len(recent) > PROCESSED_OPS_PER_CLIENT:
+            recent.popitem(last=False)
+
+def read_hello(reader):
+    """Reads the first line of a connection: a bare client ID, or from clients that can
+    resume a session {"client_id": ..., "session": token, "seq": last processed update}.
+    Returns (client_id, token, seq)."""
+    line = reader.readline().strip()
+    if line.startswith("{"):
+        hello = json.loads(line)
+        return str(hello.get("client_id")), hello.get("session"), int(hello.get("seq", 0))
+    return line, None, 0
 
+def handle_client(client_socket, client_address):
+    """Handles communication with a connected client."""
+    global next_notification_id
+    client_id = None
+    connection = None
+    session = None
+    try:
+        if tls_context is not None:
+            client_socket = server_handshake(tls_context, client_socket)  # On this thread, not the accept loop
+        reader = client_socket.makefile("r", encoding="utf-8")  # Messages are newline-delimited JSON
+        client_id, token, seq = read_hello(reader)
+        with data_lock:  # No update may be recorded between resuming and registering the connection
+            if token is not None:
+                session, missed = sessions.resume(token, client_id, seq, client_socket)
+            resumed = session is not None
+            if not resumed and client_id not in client_data:
+                # Send invalid ID message before closing
+                error_msg = json.dumps({"type": "invalid_id"}) + "\n"
+                client_socket.sendall(error_msg.encode("utf-8"))
+                client_socket.close()
+                client_id = None
+                return
 
-        clients[client_id] = client_socket
-        print(f"Client {client_id} connected from {client_address}")
+            previous = clients.get(client_id)
+            connection = OutboundQueue(client_socket, client_id,
+                                       on_error=lambda: remove_client_connection(client_id, connection))
+            clients[client_id] = connection
+            if resumed:
+                if previous is not None:
+                    previous.close()  # Stale connection the client has already given up on
+                # The token proves the ID was already validated, and the client still has
+                # its state: it only needs the updates sent while it was away
+                connection.send("session", {"token": session.token, "resumed": True}, PRIORITY_HIGH)
+                for update_seq, update_type, data in missed:
+                    connection.send(update_type, data, PRIORITY_NORMAL, update_seq)
+            else:
+                session = sessions.create(client_id, client_socket)
+        if resumed:
+            print(f"Client {client_id} resumed its session from {client_address}, {len(missed)} missed update(s)")
+        else:
+            print(f"Client {client_id} connected from {client_address}")
 
-        # Send initial tasks and unread notifications
-        send_update_to_client(client_id, "initial_tasks", tasks.get(client_id, []))
-        unread_notifications = [n for n in notifications if n["client_id"] in (client_id, "ALL") and n["status"] == "unread"]
-        send_update_to_client(client_id, "initial_notifications", unread_notifications)
+            # Built when they reach the front of the low-priority lane, so updates queued meanwhile aren't lost
+            send_update_to_client(client_id, "initial_tasks", lambda: initial_tasks_payload(client_id))
+            send_update_to_client(client_id, "initial_notifications", lambda: initial_notifications_payload(client_id))
+            # Only sent once the client has the full initial sync, so it never resumes from a partial one
+            send_update_to_client(client_id, "session", {"token": session.token, "resumed": False})
 
         while True:
             try:
-                message = client_socket.recv(1024).decode("utf-8")
+                message = reader.readline()
                 if not message:
                     break
                 data = json.loads(message)
 
-                if "task_update" in data:
-                    task_update = data["task_update"]
-                    task_id = task_update["task_id"]  # Now expecting a *task_id*
-                    status = task_update["status"]
-                    if client_id in tasks and 0 <= task_id < len(tasks[client_id]):
-                        tasks[client_id][task_id]["status"] = status
-                        save_data()
-                        print(f"Task {task_id} for client {client_id} updated to {status}")
-
-                elif "notification_read" in data:
-                    notification_id = data["notification_read"]
-                    for notification in notifications:
-                        if notification["client_id"] == client_id and notification["id"] == notification_id:
-                            notification["status"] = "read"
-                            notification["read_timestamp"] = QDateTime.currentDateTime().toString("yyyy-MM-dd HH:mm:ss")
-                            save_data()
-                            break # Stop searching after the first matching ID.
+                op_id = data.get("op_id")  # Idempotency key of a replayable client operation
+                if op_id is None or not op_already_applied(client_id, op_id):
+                    try:
+                        dispatch_client_message(client_id, data)
+                    except (ValueError, KeyError, TypeError) as e:
+                        print(f"Ignoring invalid message from client {client_id}: {e}")
+                if op_id is not None:
+                    remember_op(client_id, op_id)
+                    send_update_to_client(client_id, "ack", {"op_id": op_id})
             except (json.JSONDecodeError, ConnectionResetError, BrokenPipeError) as e:
                 print(f"Client {client_id} error: {e}")
                 break
@@ -154,7 +989,10 @@ def handle_client(client_socket, client_address):
     except Exception as e:
         print(f"Error during client setup: {e}")
     finally:
-         remove_client_connection(client_id)
+         if connection is not None:
+             remove_client_connection(client_id, connection)
+         if session is not None:
+             sessions.disconnected(session, client_socket)
 
 
 def start_server(host, port):
@@ -163,7 +1001,7 @@ def start_server(host, port):
         server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server.bind((host, port))
         server.listen(5)
-        print(f"Server listening on {host}:{port}")
+        print(f"Server listening on {host}:{port}{' (TLS)' if tls_context is not None else ''}")
         while True:
             try:
                 client_socket, client_address = server.accept()
@@ -175,6 +1013,23 @@ def start_server(host, port):
         sys.exit(1)
 
 
+def shutdown():
+    """Writes any pending changes before the process exits."""
+    if scheduler is not None:
+        scheduler.stop()
+    persistence.stop()
+    print(f"Persistence stats: {persistence.stats()}")
+    print(f"Message latency: {latency_stats()}")
+    print(f"Sessions: {sessions.stats()}")
+    if replication_feed is not None:
+        print(f"Replication: {replication_feed.stats()}")
+        replication_feed.close()
+    if replication_follower is not None:
+        replication_follower.stop()
+    if tls_context is not None:
+        stats = tls_context.session_stats()
+        print(f"TLS handshakes: {stats['accept_good']}, resumed: {stats['hits']}")
+
 
 class ServerConfigDialog(QDialog):
     """Dialog for initial server configuration."""
@@ -209,8 +1064,98 @@ class AdminPanel(QMainWindow):
         self.setup_clients_tab()
         self.setup_tasks_tab()
         self.setup_notifications_tab()
+        self.setup_archive_tab()
+        self.setup_schedules_tab()
+        self.setup_analytics_tab()
+        self.setup_tools_menu()
         self.load_existing_data()  # Load data *after* setting up the tabs
 
+    def setup_tools_menu(self):
+        tools_menu = self.menuBar().addMenu("Tools")
+        self.profiling_action = QAction("Start Profiling", self)
+        self.profiling_action.triggered.connect(self.toggle_profiling)
+        tools_menu.addAction(self.profiling_action)
+        persistence_stats_action = QAction("Persistence Stats", self)
+        persistence_stats_action.triggered.connect(self.show_persistence_stats)
+        tools_menu.addAction(persistence_stats_action)
+
+        latency_action = QAction("Message Latency", self)
+        latency_action.triggered.connect(self.show_latency_stats)
+        tools_menu.addAction(latency_action)
+
+        replication_action = QAction("Replication Status", self)
+        replication_action.triggered.connect(self.show_replication_status)
+        tools_menu.addAction(replication_action)
+        self.promote_action = QAction("Promote to Primary", self)
+        self.promote_action.triggered.connect(self.promote)
+        tools_menu.addAction(self.promote_action)
+
+    def show_persistence_stats(self):
+        stats = persistence.stats()
+        text = (
+            f"Edits: {stats['edits']}\n"
+            f"Disk writes: {stats['writes']}\n"
+            f"Edits per write: {stats['edits_per_write']:.1f}\n"
+            f"Bytes written: {stats['bytes_written']}\n"
+            f"Bytes written per edit: {stats['bytes_per_edit']:.0f}\n"
+            f"Last write: {stats['last_write_ms']:.1f} ms"
+        )
+        if isinstance(tasks, PartitionedTasks):
+            shard_stats = tasks.stats()
+            text += (f"\n\nTask shards loaded: {shard_stats['resident_shards']} of {shard_stats['shard_count']}\n"
+                     f"Clients loaded: {shard_stats['resident_clients']}\n"
+                     f"Shard loads / evictions: {shard_stats['loads']} / {shard_stats['evictions']}")
+        QMessageBox.information(self, "Persistence Stats", text)
+
+    def show_latency_stats(self):
+        lines = [f"{'Priority':<10}{'Messages':>10}{'Avg ms':>10}{'p95 ms':>10}{'Max ms':>10}"]
+        for name, stats in latency_stats().items():
+            lines.append(f"{name:<10}{stats['messages']:>10}{stats['avg_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+        QMessageBox.information(self, "Message Latency", "Time from queueing to fully sent, per priority:\n\n" + "\n".join(lines))
+
+    def show_replication_status(self):
+        follower = replication_follower
+        if follower is not None:
+            state = "connected" if follower.connected else "disconnected"
+            text = (f"Standby of {follower.host}:{follower.port} ({state})\n"
+                    f"Applied LSN: {follower.lsn}\n"
+                    f"Last heard from primary: {time.monotonic() - follower.last_contact:.0f} s ago")
+        elif replication_feed is not None:
+            stats = replication_feed.stats()
+            text = f"Primary at LSN {stats['lsn']}\n"
+            text += "\n".join(f"Standby {standby['address']}: applied {standby['acked_lsn']}, {standby['lag']} behind"
+                              for standby in stats["standbys"]) or "No standby connected"
+        else:
+            text = "Replication is off. Set \"replication_port\" on the primary and \"standby_of\" on the standby."
+        QMessageBox.information(self, "Replication Status", text)
+
+    def promote(self):
+        confirm = QMessageBox.question(self, "Promote to Primary", "Stop following the primary and start serving clients? "
+                                       "Only do this once the primary is down.",
+                                       QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if confirm == QMessageBox.StandardButton.Yes:
+            promote_to_primary(self.host, self.port)
+            self.update_role()
+
+    def update_role(self):
+        """Shows whether this server is a standby; a standby's data is read-only until it is promoted."""
+        standby = replication_follower is not None
+        self.setWindowTitle("Task Management System - Admin" + (" (standby)" if standby else ""))
+        self.promote_action.setEnabled(standby)
+        for index in range(self.tabs.count()):
+            if self.tabs.widget(index) is not self.analytics_tab:  # Reports stay readable, counters are replicated
+                self.tabs.widget(index).setEnabled(not standby)
+        self.recount_analytics_button.setEnabled(not standby)
+
+    def toggle_profiling(self):
+        """Starts or stops the sampling profiler and timing spans."""
+        paths = profiling.toggle()
+        if profiling.enabled:
+            self.profiling_action.setText("Stop Profiling")
+        else:
+            self.profiling_action.setText("Start Profiling")
+            QMessageBox.information(self, "Profiling", "Profile written to:\n" + "\n".join(paths))
+
     def setup_clients_tab(self):
         self.clients_tab = QWidget()
         layout = QVBoxLayout()
@@ -248,7 +1193,8 @@ class AdminPanel(QMainWindow):
         client_name = self.client_name_input.text().strip()
         if client_id and client_ip and client_name:
             if client_id not in client_data:
-                client_data[client_id] = {"ip": client_ip, "name": client_name}
+                with data_lock:
+                    client_data[client_id] = {"ip": client_ip, "name": client_name}
                 save_data()
                 self.refresh_client_table()
                 self.update_client_filter()  # Update the filters *after* adding a client
@@ -266,15 +1212,20 @@ class AdminPanel(QMainWindow):
             client_id = self.client_table.item(selected_row, 0).text()
             confirm = QMessageBox.question(self, "Confirm Removal", f"Are you sure you want to remove client {client_id}?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
             if confirm == QMessageBox.StandardButton.Yes:
+                sessions.drop_client(client_id)  # It must not be able to resume either
                 if client_id in clients:
-                    remove_client_connection(client_id)  # Close socket
-                del client_data[client_id]
-                if client_id in tasks:  # Remove associated tasks
-                    del tasks[client_id]
+                    send_update_to_client(client_id, "client_removed", {})
+                    remove_client_connection(client_id, drain_timeout=1.0)  # Close socket once the notice is out
+                with data_lock:
+                    del client_data[client_id]
+                    if client_id in tasks:  # Remove associated tasks
+                        del tasks[client_id]
+                    analytics.drop_client(client_id)
+                    processed_ops.pop(client_id, None)
                 save_data()
                 self.refresh_client_table()
                 self.update_client_filter()  # Update filters after removing
-                self.refresh_task_table()
+                self.filter_tasks()
 
         else:
             QMessageBox.warning(self, "Error", "Please select a client to remove!")
@@ -283,15 +1234,18 @@ class AdminPanel(QMainWindow):
         try:
             client_id = self.client_table.item(row, 0).text()
             if client_id in client_data:
-                if column == 1:  # Client IP
-                    client_data[client_id]["ip"] = self.client_table.item(row, column).text()
-                elif column == 2:  # Client Name
-                    client_data[client_id]["name"] = self.client_table.item(row, column).text()
-                save_data()
+                field = {1: "ip", 2: "name"}.get(column)
+                new_value = self.client_table.item(row, column).text()
+                if field and client_data[client_id][field] != new_value:
+                    with data_lock:
+                        client_data[client_id][field] = new_value
+                    save_data()
         except Exception as e:
             QMessageBox.critical(self,"Error", f"Failed to update the client: {e}")
 
+    @profiling.span("AdminPanel.refresh_client_table")
     def refresh_client_table(self):
+        self.client_table.blockSignals(True)  # Don't treat the rebuild as user edits
         try:
             self.client_table.setRowCount(0)
             for client_id, info in client_data.items():
@@ -302,6 +1256,8 @@ class AdminPanel(QMainWindow):
                 self.client_table.setItem(row_position, 2, QTableWidgetItem(info["name"]))
         except Exception as e:
              QMessageBox.critical(self,"Error", f"Failed to refresh client table: {e}")
+        finally:
+            self.client_table.blockSignals(False)
 
     def setup_tasks_tab(self):
         self.tasks_tab = QWidget()
@@ -325,6 +1281,8 @@ class AdminPanel(QMainWindow):
         self.task_table.setHorizontalHeaderLabels(["Client ID", "Task", "Due Date", "Status"])
         self.task_table.setMinimumHeight(150)
         self.task_table.setEditTriggers(QTableWidget.EditTrigger.DoubleClicked)
+        self.task_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.task_table.setSelectionMode(QTableWidget.SelectionMode.ExtendedSelection)  # Bulk operations
         self.task_table.cellChanged.connect(self.update_task_in_json)
 
         # Task Input Fields
@@ -333,9 +1291,13 @@ class AdminPanel(QMainWindow):
         self.due_date_input = QLineEdit()
         self.add_task_button = QPushButton("Assign Task")
         self.status_selector = QComboBox()
-        self.status_selector.addItems(["Pending", "In Progress", "Completed"])
+        self.status_selector.addItems(STATUS_LABELS)
         self.update_status_button = QPushButton("Update Status")
-        self.delete_task_button = QPushButton("Delete Task")
+        self.delete_task_button = QPushButton("Delete Tasks")
+        self.reassign_selector = QComboBox()
+        self.reassign_button = QPushButton("Reassign Tasks")
+        self.shift_days_input = QLineEdit("1")
+        self.shift_due_button = QPushButton("Shift Due Dates")
 
         # Layout
         layout.addLayout(filter_layout)
@@ -351,6 +1313,14 @@ class AdminPanel(QMainWindow):
         layout.addWidget(QLabel("Update Status:"))
         layout.addWidget(self.status_selector)
         layout.addWidget(self.update_status_button)
+        bulk_layout = QHBoxLayout()
+        bulk_layout.addWidget(QLabel("Reassign to:"))
+        bulk_layout.addWidget(self.reassign_selector)
+        bulk_layout.addWidget(self.reassign_button)
+        bulk_layout.addWidget(QLabel("Shift by days:"))
+        bulk_layout.addWidget(self.shift_days_input)
+        bulk_layout.addWidget(self.shift_due_button)
+        layout.addLayout(bulk_layout)
         layout.addWidget(self.delete_task_button)
         self.tasks_tab.setLayout(layout)
         self.tabs.addTab(self.tasks_tab, "Tasks")
@@ -359,6 +1329,8 @@ class AdminPanel(QMainWindow):
         self.add_task_button.clicked.connect(self.assign_task)
         self.update_status_button.clicked.connect(self.update_task_status)
         self.delete_task_button.clicked.connect(self.delete_task)
+        self.reassign_button.clicked.connect(self.reassign_tasks)
+        self.shift_due_button.clicked.connect(self.shift_due_dates)
         self.filter_button.clicked.connect(self.filter_tasks)
 
     def update_client_filter(self):
@@ -380,6 +1352,14 @@ class AdminPanel(QMainWindow):
         if client_index >=0:
              self.client_selector.setCurrentIndex(client_index)
 
+        # And the bulk reassign target
+        current_target = self.reassign_selector.currentText()
+        self.reassign_selector.clear()
+        self.reassign_selector.addItems(client_data.keys())
+        target_index = self.reassign_selector.findText(current_target)
+        if target_index >= 0:
+            self.reassign_selector.setCurrentIndex(target_index)
+
         # Update the notification client selector too
         current_notify_client = self.client_selector_notify.currentText()
         self.client_selector_notify.clear()
@@ -389,6 +1369,26 @@ class AdminPanel(QMainWindow):
         if notify_index >= 0:
             self.client_selector_notify.setCurrentIndex(notify_index)
 
+        # And the recurring task client selector
+        current_schedule_client = self.schedule_client_selector.currentText()
+        self.schedule_client_selector.clear()
+        self.schedule_client_selector.addItem("ALL")
+        self.schedule_client_selector.addItems(client_data.keys())
+        schedule_index = self.schedule_client_selector.findText(current_schedule_client)
+        if schedule_index >= 0:
+            self.schedule_client_selector.setCurrentIndex(schedule_index)
+
+        # And the analytics client filter, without refreshing the report once per change
+        current_analytics_client = self.analytics_client_filter.currentText()
+        self.analytics_client_filter.blockSignals(True)
+        self.analytics_client_filter.clear()
+        self.analytics_client_filter.addItem("All Clients")
+        self.analytics_client_filter.addItems(client_data.keys())
+        analytics_index = self.analytics_client_filter.findText(current_analytics_client)
+        if analytics_index >= 0:
+            self.analytics_client_filter.setCurrentIndex(analytics_index)
+        self.analytics_client_filter.blockSignals(False)
+
 
 
     def filter_tasks(self):
@@ -396,70 +1396,104 @@ class AdminPanel(QMainWindow):
         date_order = self.date_order_filter.currentText()
         self.refresh_task_table(selected_client, date_order)
 
+    @profiling.span("AdminPanel.refresh_task_table")
     def refresh_task_table(self, client_filter="All Clients", date_order="Ascending"):
+      # Selected rows are restored by task uid, so a periodic refresh doesn't undo a bulk selection
+      selected_uids = {(index.data(), index.data(TASK_UID_ROLE)) for index in self.task_table.selectionModel().selectedRows(0)}
+      self.task_table.blockSignals(True)  # Don't treat the rebuild as user edits
       try:
         self.task_table.setRowCount(0)
         filtered_tasks = []
 
-        # Filter by client
-        for client_id, task_list in tasks.items():
-            if client_filter == "All Clients" or client_id == client_filter:
-                for task in task_list:
-                    filtered_tasks.append((client_id, task))
+        # Filter by client. In partitioned storage "All Clients" only lists clients whose shard is loaded.
+        if client_filter == "All Clients":
+            selected = resident_task_items()
+        else:
+            selected = [(client_filter, tasks.get(client_filter, []))]
+        for client_id, task_list in selected:
+            for task_index, task in enumerate(task_list):
+                filtered_tasks.append((client_id, task_index, task))
 
         # Sort by due date
-        filtered_tasks.sort(key=lambda x: x[1]["due_date"], reverse=(date_order == "Descending"))
-
-        # Populate the table
-        for client_id, task in filtered_tasks:
-            row_position = self.task_table.rowCount()
-            self.task_table.insertRow(row_position)
-            self.task_table.setItem(row_position, 0, QTableWidgetItem(client_id))
-            self.task_table.setItem(row_position, 1, QTableWidgetItem(task["description"]))
-            self.task_table.setItem(row_position, 2, QTableWidgetItem(task["due_date"]))
-            self.task_table.setItem(row_position, 3, QTableWidgetItem(task["status"]))
+        filtered_tasks.sort(key=lambda x: x[2].due, reverse=(date_order == "Descending"))
+
+        # Populate the table, sized once up front since it can hold tens of thousands of rows
+        self.task_table.setUpdatesEnabled(False)
+        self.task_table.setRowCount(len(filtered_tasks))
+        for row_position, (client_id, task_index, task) in enumerate(filtered_tasks):
+            client_item = QTableWidgetItem(client_id)
+            client_item.setData(Qt.ItemDataRole.UserRole, task_index)  # Position in tasks[client_id]
+            client_item.setData(TASK_UID_ROLE, task.uid)  # To detect a stale position, see resolve_selection
+            self.task_table.setItem(row_position, 0, client_item)
+            self.task_table.setItem(row_position, 1, QTableWidgetItem(task.description))
+            self.task_table.setItem(row_position, 2, QTableWidgetItem(task.due_date))
+            self.task_table.setItem(row_position, 3, QTableWidgetItem(task.status_label))
+        if selected_uids:
+            self.restore_task_selection([row for row, (client_id, _, task) in enumerate(filtered_tasks)
+                                         if (client_id, task.uid) in selected_uids])
       except Exception as e:
             QMessageBox.critical(self,"Error", f"Failed to refresh task table: {e}")
-
+      finally:
+            self.task_table.setUpdatesEnabled(True)
+            self.task_table.blockSignals(False)
+
+
+    def restore_task_selection(self, rows):
+        """Selects the given ascending table rows, as one range per run of adjacent rows."""
+        selection = QItemSelection()
+        model = self.task_table.model()
+        last_column = self.task_table.columnCount() - 1
+        start = 0
+        while start < len(rows):
+            end = start
+            while end + 1 < len(rows) and rows[end + 1] == rows[end] + 1:
+                end += 1
+            selection.select(model.index(rows[start], 0), model.index(rows[end], last_column))
+            start = end + 1
+        self.task_table.selectionModel().select(selection, QItemSelectionModel.SelectionFlag.ClearAndSelect)
 
     def update_task_in_json(self, row, column):
         try:
             client_id_item = self.task_table.item(row, 0)
-            description_item = self.task_table.item(row, 1)
-            due_date_item = self.task_table.item(row, 2)
-            status_item = self.task_table.item(row, 3)
-
-            if client_id_item is None or description_item is None or due_date_item is None or status_item is None:
+            edited_item = self.task_table.item(row, column)
+            field = {1: "description", 2: "due_date", 3: "status"}.get(column)
+            if client_id_item is None or edited_item is None or field is None:
                 return
 
             client_id = client_id_item.text()
-            if client_id in tasks:
-                # Find the index of the task within the client's task list
-                task_index = -1
-                for i, task in enumerate(tasks[client_id]):
-                    if (task["description"] == description_item.text() and
-                        task["due_date"] == due_date_item.text() and
-                        task["status"] == status_item.text()):
-                        task_index = i
-                        break
-
-                if task_index != -1:
-                    updated_value = self.task_table.item(row, column).text()
-                    if column == 1:
-                        tasks[client_id][task_index]["description"] = updated_value
-                    elif column == 2:
-                        tasks[client_id][task_index]["due_date"] = updated_value
-                    elif column == 3:
-                        tasks[client_id][task_index]["status"] = updated_value
-
-                    save_data()
-                    # Send update to client
-                    send_update_to_client(client_id, "task_update_admin", {
-                        "task_id": task_index,
-                        "description": tasks[client_id][task_index]["description"],
-                        "due_date": tasks[client_id][task_index]["due_date"],
-                        "status": tasks[client_id][task_index]["status"]
-                    })
+            task_index = client_id_item.data(Qt.ItemDataRole.UserRole)
+            uid = client_id_item.data(TASK_UID_ROLE)
+            with data_lock:
+                task_list = tasks.get(client_id, [])
+                if task_index is not None and 0 <= task_index < len(task_list) and task_list[task_index].uid == uid:
+                    task = task_list[task_index]
+                else:  # The list changed since the table was built (archival, bulk delete/reassign)
+                    task_index, task = find_task(client_id, uid)
+            if task is None:
+                QMessageBox.warning(self, "Error", "This task no longer exists.")
+                self.filter_tasks()
+                return
+            updated_value = edited_item.text()
+            if task.to_dict()[field] == updated_value:
+                return
+            if field == "status" and updated_value not in STATUS_LABELS:
+                QMessageBox.warning(self, "Error", f"Status must be one of: {', '.join(STATUS_LABELS)}")
+                edited_item.setText(task.status_label)
+                return
+            with data_lock:
+                if field == "description":
+                    task.description = updated_value
+                elif field == "due_date":
+                    analytics.remove(client_id, task)
+                    task.due_date = updated_value
+                    analytics.add(client_id, task)
+                else:
+                    set_task_status(client_id, task, TaskStatus.parse(updated_value))
+            save_data()
+            if field != "description":
+                schedule_task_timers(client_id, task, new_due_date=(field == "due_date"))
+            # Send update to client
+            send_update_to_client(client_id, "task_update_admin", task.to_wire(task_index))
         except Exception as e:
             QMessageBox.critical(self,"Error", f"Failed to update task in JSON: {e}")
 
@@ -470,17 +1504,8 @@ class AdminPanel(QMainWindow):
         due_date = self.due_date_input.text().strip()
         if client_id and task_description and due_date:
             if client_id in client_data:
-                if client_id not in tasks:
-                    tasks[client_id] = []
-                new_task = {"description": task_description, "due_date": due_date, "status": "Pending"}
-                tasks[client_id].append(new_task)
-                save_data()
-                self.refresh_task_table()
-
-                # Send the new task to the client.  Include task_id.
-                task_id = len(tasks[client_id]) -1
-                send_update_to_client(client_id, "new_task", {"task_id": task_id, **new_task}) # Send task with ID
-
+                add_task(client_id, task_description, due_date)
+                self.filter_tasks()
             else:
                 QMessageBox.warning(self, "Error", "Client ID does not exist!")
         else:
@@ -490,54 +1515,58 @@ class AdminPanel(QMainWindow):
         #Don't clear the client selector
         self.due_date_input.clear()
 
+    def selected_tasks(self):
+        """Returns the selected rows as {client_id: [(task_index, uid)]}, see resolve_selection."""
+        selection = {}
+        for index in self.task_table.selectionModel().selectedRows(0):
+            selection.setdefault(index.data(), []).append(
+                (index.data(Qt.ItemDataRole.UserRole), index.data(TASK_UID_ROLE)))
+        return selection
+
     def update_task_status(self):
-        selected_row = self.task_table.currentRow()
-        if selected_row >= 0:
-            client_id = self.task_table.item(selected_row, 0).text()
-            if client_id in tasks:
-                # Find the index of the task within the client's task list
-                task_index = -1
-                for i, task in enumerate(tasks[client_id]):
-                    if (task["description"] == self.task_table.item(selected_row,1).text() and
-                        task["due_date"] == self.task_table.item(selected_row,2).text() and
-                        task["status"] == self.task_table.item(selected_row,3).text()
-                        ):
-                        task_index = i
-                        break
-                if task_index != -1:
-                    new_status = self.status_selector.currentText()
-                    tasks[client_id][task_index]["status"] = new_status
-                    save_data()
-                    self.refresh_task_table()
-                    # Send update to client
-                    send_update_to_client(client_id, "task_update_admin", {"task_id":task_index, "description":tasks[client_id][task_index]["description"],"due_date":tasks[client_id][task_index]["due_date"], "status": tasks[client_id][task_index]["status"]})
-        else:
-            QMessageBox.warning(self, "Error", "Please select a task to update!")
+        selection = self.selected_tasks()
+        if not selection:
+            QMessageBox.warning(self, "Error", "Please select the tasks to update!")
+            return
+        bulk_update_tasks(selection, status=TaskStatus.parse(self.status_selector.currentText()))
+        self.filter_tasks()
 
     def delete_task(self):
-        selected_row = self.task_table.currentRow()
-        if selected_row >= 0:
-            client_id = self.task_table.item(selected_row, 0).text()
-            if client_id in tasks:
-                # Find the index of the task
-                task_index = -1
-                for i, task in enumerate(tasks[client_id]):
-                    if (task["description"] == self.task_table.item(selected_row,1).text() and
-                        task["due_date"] == self.task_table.item(selected_row,2).text() and
-                        task["status"] == self.task_table.item(selected_row,3).text()
-                        ):
-                            task_index = i
-                            break
-                if task_index!=-1:
-                    confirm = QMessageBox.question(self, "Confirm Deletion", "Are you sure you want to delete this task?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-                    if confirm == QMessageBox.StandardButton.Yes:
-                        deleted_task = tasks[client_id].pop(task_index)  # Remove the task
-                        save_data()
-                        self.refresh_task_table()
-                        # Send task deletion notification to client
-                        send_update_to_client(client_id, "delete_task", {"task_id": task_index})  # Send task_id
-        else:
-            QMessageBox.warning(self, "Error", "Please select a task to delete!")
+        selection = self.selected_tasks()
+        if not selection:
+            QMessageBox.warning(self, "Error", "Please select the tasks to delete!")
+            return
+        count = sum(len(entries) for entries in selection.values())
+        confirm = QMessageBox.question(self, "Confirm Deletion", f"Are you sure you want to delete {count} task(s)?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if confirm == QMessageBox.StandardButton.Yes:
+            bulk_delete_tasks(selection)
+            self.filter_tasks()
+
+    def reassign_tasks(self):
+        selection = self.selected_tasks()
+        target_client = self.reassign_selector.currentText()
+        if not selection or target_client not in client_data:
+            QMessageBox.warning(self, "Error", "Please select the tasks and the client to reassign them to!")
+            return
+        bulk_reassign_tasks(selection, target_client)
+        self.filter_tasks()
+
+    def shift_due_dates(self):
+        selection = self.selected_tasks()
+        try:
+            shift_days = int(self.shift_days_input.text())
+        except ValueError:
+            QMessageBox.warning(self, "Error", "The shift must be a whole number of days.")
+            return
+        if not selection:
+            QMessageBox.warning(self, "Error", "Please select the tasks to reschedule!")
+            return
+        try:
+            bulk_update_tasks(selection, shift_days=shift_days)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+        self.filter_tasks()
 
     def setup_notifications_tab(self):
         self.notifications_tab = QWidget()
@@ -570,38 +1599,18 @@ class AdminPanel(QMainWindow):
 
 
     def send_notification(self):
-        global next_notification_id
         client_id = self.client_selector_notify.currentText()
         message = self.notification_input.toPlainText().strip()
 
         if message:
-            timestamp = QDateTime.currentDateTime().toString("yyyy-MM-dd HH:mm:ss")
-            notification = {
-                "id": next_notification_id,
-                "client_id": client_id,
-                "message": message,
-                "status": "unread",
-                "timestamp": timestamp,
-                "read_timestamp": None  # Will be set when read
-            }
-
-            notifications.append(notification)
-            next_notification_id += 1
-            save_data()
+            post_notification(client_id, message)
             QMessageBox.information(self, "Success", "Notification sent!")
             self.refresh_notification_list()  # Refresh the UI
-
-            # **Send notification to the appropriate client(s)**
-            if client_id == "ALL":
-                for cid in clients:  # Send to all connected clients
-                    send_update_to_client(cid, "new_notification", notification)
-            elif client_id in clients:
-                send_update_to_client(client_id, "new_notification", notification)
-
             self.notification_input.clear()  # Clear input field
         else:
             QMessageBox.warning(self, "Error", "Please enter a notification message")
 
+    @profiling.span("AdminPanel.refresh_notification_list")
     def refresh_notification_list(self):
         """Refreshes the notification list in the UI."""
         self.notification_list.setRowCount(0)  # Clear existing rows
@@ -622,16 +1631,222 @@ class AdminPanel(QMainWindow):
             notification_to_delete = next((n for n in notifications if n["id"] == notification_id), None)
             if notification_to_delete:
                 client_id = notification_to_delete["client_id"]
-                notifications[:] = [n for n in notifications if n["id"] != notification_id]
+                with data_lock:
+                    notifications[:] = [n for n in notifications if n["id"] != notification_id]
                 save_data()
                 self.refresh_notification_list()
 
                 # Send delete command to relevant clients
-                if client_id == "ALL":
-                    for cid in clients:
-                        send_update_to_client(cid, "delete_notification", {"id": notification_id})
-                elif client_id in clients:
-                    send_update_to_client(client_id, "delete_notification", {"id": notification_id})
+                for cid in notification_recipients(client_id):
+                    send_update_to_client(cid, "delete_notification", {"id": notification_id})
+
+    def setup_archive_tab(self):
+        self.archive_tab = QWidget()
+        layout = QVBoxLayout()
+
+        search_layout = QHBoxLayout()
+        self.archive_client_input = QLineEdit()
+        self.archive_text_input = QLineEdit()
+        self.archive_search_button = QPushButton("Search Archive")
+        search_layout.addWidget(QLabel("Client ID:"))
+        search_layout.addWidget(self.archive_client_input)
+        search_layout.addWidget(QLabel("Text:"))
+        search_layout.addWidget(self.archive_text_input)
+        search_layout.addWidget(self.archive_search_button)
+
+        self.archive_table = QTableWidget()
+        self.archive_table.setColumnCount(5)
+        self.archive_table.setHorizontalHeaderLabels(["Type", "Client ID", "Task / Message", "Date", "Archived At"])
+        self.archive_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.archive_status_label = QLabel("Archival has not run yet.")
+        self.run_archival_button = QPushButton("Run Archival Now")
+
+        layout.addLayout(search_layout)
+        layout.addWidget(self.archive_table)
+        layout.addWidget(self.archive_status_label)
+        layout.addWidget(self.run_archival_button)
+        self.archive_tab.setLayout(layout)
+        self.tabs.addTab(self.archive_tab, "Archive")
+        self.archive_search_button.clicked.connect(self.search_archive)
+        self.run_archival_button.clicked.connect(archive_requested.set)  # Runs on the archive thread
+
+    def search_archive(self):
+        results = archive_store.search(self.archive_client_input.text().strip(), self.archive_text_input.text().strip())
+        self.archive_table.setRowCount(len(results))
+        for row, result in enumerate(results):
+            data = result["data"]
+            if result["kind"] == "Task":
+                text, date = data.get("description", ""), data.get("due_date", "")
+            else:
+                text, date = data.get("message", ""), data.get("read_timestamp") or ""
+            self.archive_table.setItem(row, 0, QTableWidgetItem(result["kind"]))
+            self.archive_table.setItem(row, 1, QTableWidgetItem(result["client_id"]))
+            self.archive_table.setItem(row, 2, QTableWidgetItem(text))
+            self.archive_table.setItem(row, 3, QTableWidgetItem(date))
+            self.archive_table.setItem(row, 4, QTableWidgetItem(result["archived_at"]))
+
+    def refresh_archive_status(self):
+        if last_archive_report:
+            report = last_archive_report
+            self.archive_status_label.setText(
+                f"Last run {report['finished']}: archived {report['tasks']} tasks and "
+                f"{report['notifications']} notifications, reclaimed ~{report['reclaimed_bytes'] / 1024:.1f} KiB")
+
+    def setup_schedules_tab(self):
+        self.schedules_tab = QWidget()
+        layout = QVBoxLayout()
+
+        self.schedule_table = QTableWidget()
+        self.schedule_table.setColumnCount(5)
+        self.schedule_table.setHorizontalHeaderLabels(["ID", "Client ID", "Task", "Repeats", "Next Run"])
+        self.schedule_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.schedule_client_selector = QComboBox()
+        self.schedule_task_input = QLineEdit()
+        self.schedule_interval_selector = QComboBox()
+        self.schedule_interval_selector.addItems(RECURRENCE_DAYS.keys())
+        self.schedule_due_input = QLineEdit("1")
+        self.add_schedule_button = QPushButton("Add Recurring Task")
+        self.remove_schedule_button = QPushButton("Remove Recurring Task")
+
+        layout.addWidget(QLabel("Recurring Tasks:"))
+        layout.addWidget(self.schedule_table)
+        layout.addWidget(QLabel("Assign to (Select 'ALL' for all clients):"))
+        layout.addWidget(self.schedule_client_selector)
+        layout.addWidget(QLabel("Task:"))
+        layout.addWidget(self.schedule_task_input)
+        layout.addWidget(QLabel("Repeats:"))
+        layout.addWidget(self.schedule_interval_selector)
+        layout.addWidget(QLabel("Due after (days):"))
+        layout.addWidget(self.schedule_due_input)
+        layout.addWidget(self.add_schedule_button)
+        layout.addWidget(self.remove_schedule_button)
+        self.schedules_tab.setLayout(layout)
+        self.tabs.addTab(self.schedules_tab, "Schedules")
+        self.add_schedule_button.clicked.connect(self.add_schedule)
+        self.remove_schedule_button.clicked.connect(self.remove_schedule)
+
+    def add_schedule(self):
+        client_id = self.schedule_client_selector.currentText()
+        description = self.schedule_task_input.text().strip()
+        try:
+            due_in_days = int(self.schedule_due_input.text())
+        except ValueError:
+            QMessageBox.warning(self, "Error", "Due after must be a whole number of days!")
+            return
+        if client_id and description:
+            add_recurring_task(client_id, description, RECURRENCE_DAYS[self.schedule_interval_selector.currentText()],
+                               due_in_days)
+            self.schedule_task_input.clear()
+            self.refresh_schedule_table()
+        else:
+            QMessageBox.warning(self, "Error", "Please enter task details.")
+
+    def remove_schedule(self):
+        selected_row = self.schedule_table.currentRow()
+        if selected_row >= 0:
+            scheduler.cancel(int(self.schedule_table.item(selected_row, 0).text()))
+            save_data()  # See add_recurring_task
+            self.refresh_schedule_table()
+        else:
+            QMessageBox.warning(self, "Error", "Please select a recurring task to remove!")
+
+    def refresh_schedule_table(self):
+        if scheduler is None:
+            return
+        jobs = sorted(scheduler.jobs("recurring"), key=lambda job: job.job_id)
+        self.schedule_table.setRowCount(len(jobs))
+        for row, job in enumerate(jobs):
+            repeats = next((label for label, days in RECURRENCE_DAYS.items() if days == job.payload["interval_days"]),
+                           f"Every {job.payload['interval_days']} days")
+            next_run = datetime.datetime.fromtimestamp(job.fire_at).strftime("%Y-%m-%d %H:%M")
+            self.schedule_table.setItem(row, 0, QTableWidgetItem(str(job.job_id)))
+            self.schedule_table.setItem(row, 1, QTableWidgetItem(job.payload["client_id"]))
+            self.schedule_table.setItem(row, 2, QTableWidgetItem(job.payload["description"]))
+            self.schedule_table.setItem(row, 3, QTableWidgetItem(repeats))
+            self.schedule_table.setItem(row, 4, QTableWidgetItem(next_run))
+
+    def setup_analytics_tab(self):
+        self.analytics_tab = QWidget()
+        layout = QVBoxLayout()
+
+        controls_layout = QHBoxLayout()
+        self.analytics_group_selector = QComboBox()
+        self.analytics_group_selector.addItems(["Per Client", "Per Week"])
+        self.analytics_client_filter = QComboBox()
+        self.analytics_client_filter.addItem("All Clients")
+        self.export_analytics_button = QPushButton("Export CSV")
+        self.recount_analytics_button = QPushButton("Recount")
+        controls_layout.addWidget(QLabel("Group by:"))
+        controls_layout.addWidget(self.analytics_group_selector)
+        controls_layout.addWidget(QLabel("Client:"))
+        controls_layout.addWidget(self.analytics_client_filter)
+        controls_layout.addWidget(self.export_analytics_button)
+        controls_layout.addWidget(self.recount_analytics_button)
+
+        self.analytics_table = QTableWidget()
+        self.analytics_table.setColumnCount(6)
+        self.analytics_table.setHorizontalHeaderLabels(
+            ["Client ID", "Created", "Completed", "Completion Rate", "Avg Hours to Complete", "Overdue"])
+        self.analytics_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.analytics_totals_label = QLabel()
+
+        layout.addLayout(controls_layout)
+        layout.addWidget(self.analytics_table)
+        layout.addWidget(self.analytics_totals_label)
+        self.analytics_tab.setLayout(layout)
+        self.tabs.addTab(self.analytics_tab, "Analytics")
+        self.analytics_group_selector.currentIndexChanged.connect(self.refresh_analytics_table)
+        self.analytics_client_filter.currentIndexChanged.connect(self.refresh_analytics_table)
+        self.export_analytics_button.clicked.connect(self.export_analytics)
+        self.recount_analytics_button.clicked.connect(self.recount_analytics)
+
+    def analytics_client(self):
+        client_id = self.analytics_client_filter.currentText()
+        return None if client_id in ("", "All Clients") else client_id
+
+    @profiling.span("AdminPanel.refresh_analytics_table")
+    def refresh_analytics_table(self):
+        """Shows the metrics per client or per week. Only the counters are read, never the tasks."""
+        group_by = "client" if self.analytics_group_selector.currentIndex() == 0 else "week"
+        with data_lock:
+            rows = analytics.summary(group_by, self.analytics_client())
+        self.analytics_table.setHorizontalHeaderItem(0, QTableWidgetItem("Client ID" if group_by == "client" else "Week"))
+        self.analytics_table.setRowCount(len(rows))
+        created = completed = overdue = 0
+        for row, metrics in enumerate(rows):
+            rate, hours = metrics["completion_rate"], metrics["avg_hours_to_complete"]
+            values = [metrics[group_by], str(metrics["created"]), str(metrics["completed"]),
+                      f"{rate:.0%}" if rate is not None else "-", f"{hours:.1f}" if hours is not None else "-",
+                      str(metrics["overdue"])]
+            for column, value in enumerate(values):
+                self.analytics_table.setItem(row, column, QTableWidgetItem(value))
+            created += metrics["created"]
+            completed += metrics["completed"]
+            overdue += metrics["overdue"]
+        self.analytics_totals_label.setText(f"Total: {created} created, {completed} completed, {overdue} overdue")
+
+    def export_analytics(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Analytics", "task_analytics.csv", "CSV Files (*.csv)")
+        if not path:
+            return
+        client_id = self.analytics_client()
+        with data_lock:
+            rows = [row for row in analytics.rows() if client_id is None or row["client_id"] == client_id]
+        try:
+            count = analytics.write_csv(path, rows)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Failed to export analytics: {e}")
+            return
+        QMessageBox.information(self, "Export CSV", f"Wrote {count} rows (one per client and week) to {path}")
+
+    def recount_analytics(self):
+        confirm = QMessageBox.question(self, "Recount Analytics", "Recount the analytics from every task, including "
+                                       "archived ones? This reads the whole dataset.",
+                                       QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if confirm == QMessageBox.StandardButton.Yes:
+            count = rebuild_analytics()
+            self.refresh_analytics_table()
+            QMessageBox.information(self, "Recount Analytics", f"Counted {count} tasks.")
 
     def load_existing_data(self):
         load_data()
@@ -639,16 +1854,23 @@ class AdminPanel(QMainWindow):
         self.refresh_task_table()
         self.refresh_notification_list()
         self.update_client_filter() # Added - Must be called *AFTER* combo boxes are created
+        self.refresh_analytics_table()
 
+    @profiling.span("AdminPanel.refresh_all_tabs")
     def refresh_all_tabs(self):
+        self.update_role()  # A standby can be promoted by its watchdog
         self.refresh_client_table()
-        self.refresh_task_table()
+        if self.task_table.state() != QTableWidget.State.EditingState:  # Don't throw away a cell edit in progress
+            self.filter_tasks()  # Keeps the chosen filter and the selected rows
         self.refresh_notification_list()
         self.update_client_filter()
+        self.refresh_archive_status()
+        self.refresh_schedule_table()
+        self.refresh_analytics_table()
 
     def handle_client_update(self, update_type, data):
         if update_type == "task_update":
-            self.refresh_task_table()
+            self.filter_tasks()
         elif update_type == "notification_update":
             self.refresh_notification_list()
         elif update_type == "client_update":
@@ -671,8 +1893,40 @@ if __name__ == "__main__":
             sys.exit(0)  # Exit if the user cancels the config
 
     # Start server and Admin Panel
-    load_data()  # Load existing data
-    threading.Thread(target=start_server, args=(host, port), daemon=True).start()
-    window = AdminPanel(host,port)
+    config = load_config_file()
+    storage_format = config.get("storage_format", "json")
+    reminder_lead_hours = config.get("reminder_lead_hours", REMINDER_LEAD_HOURS)
+    sessions.ttl = config.get("session_ttl", SESSION_TTL)
+    if config.get("tls"):
+        tls_context = server_tls_context(config.get("tls_cert_file", TLS_CERT_FILE), config.get("tls_key_file", TLS_KEY_FILE))
+    archive_store = ArchiveStore(ARCHIVE_FILE)
+    try:
+        load_data()  # Load existing data
+    except SnapshotError as e:
+        # Starting with older or empty data would overwrite the snapshot, so leave it for the admin to restore
+        print(f"Cannot load the saved data: {e}")
+        QMessageBox.critical(None, "TaskFlow Server", f"Cannot load the saved data: {e}\n\nThe snapshot and its "
+                             ".bak copy are unreadable and were left untouched. Restore one of them from a backup, "
+                             "or delete both to start again from the JSON data files.")
+        sys.exit(1)
+    persistence.start()
+    if isinstance(tasks, PartitionedTasks):
+        threading.Thread(target=partition_eviction_loop, daemon=True).start()
+    app.aboutToQuit.connect(shutdown)
+    profiling.install_signal_handler()  # `kill -USR1 <pid>` toggles profiling
+    window = AdminPanel(host,port)  # Reloads the data, so replication starts after it
+    standby_of = config.get("standby_of")
+    if standby_of:
+        # Warm standby: mirror the primary and only serve clients once promoted
+        primary_host, _, primary_port = standby_of.rpartition(":")
+        follower_tls = client_tls_context(config.get("tls_ca_file", TLS_CERT_FILE)) if tls_context is not None else None
+        replication_follower = ReplicationFollower(primary_host, int(primary_port), apply_replicated, follower_tls)
+        replication_follower.start()
+        print(f"Standby of {standby_of}")
+        if config.get("promote_after"):
+            threading.Thread(target=standby_watchdog, args=(host, port, config["promote_after"]), daemon=True).start()
+    else:
+        start_primary_services(host, port)
+    window.update_role()
     window.show()
     sys.exit(app.exec())
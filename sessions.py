@@ -0,0 +1,137 @@
+import time
+import secrets
+import threading
+from collections import OrderedDict, deque
+
+SESSION_TTL = 300  # Seconds a disconnected session can still be resumed
+MAX_SESSIONS = 10000
+SESSION_BACKLOG = 1000  # Updates kept per session for replay after a reconnect
+
+
+class Session:
+    """Resumable view of one client: the updates sent since its initial sync, by sequence number."""
+    __slots__ = ("token", "client_id", "seq", "backlog", "owner", "last_seen")
+
+    def __init__(self, token, client_id, owner, backlog_size=SESSION_BACKLOG):
+        self.token = token
+        self.client_id = client_id
+        self.seq = 0  # Sequence number of the last recorded update
+        self.backlog = deque(maxlen=backlog_size)  # [(seq, message_type, data)]
+        self.owner = owner  # The connection using the session, None while disconnected
+        self.last_seen = time.monotonic()
+
+    def updates_since(self, seq):
+        """Returns the updates after `seq`, or None if some of them were already dropped from the backlog."""
+        if seq > self.seq or seq < 0:
+            return None
+        if seq == self.seq:
+            return []
+        if not self.backlog or self.backlog[0][0] > seq + 1:
+            return None
+        return [update for update in self.backlog if update[0] > seq]
+
+
+class SessionCache:
+    """LRU of resumable client sessions, keyed by an unguessable token.
+
+    A client that reconnects with its token and the sequence number of the last
+    update it processed gets only the updates it missed instead of a full
+    initial sync. Disconnected sessions expire after `ttl` seconds; when more
+    than `max_sessions` exist the least recently disconnected ones are evicted
+    first. Connected sessions are never evicted. A client has at most one session.
+
+    Each session is owned by the connection using it. Resuming hands it to the
+    new connection even if the old one hasn't been noticed as dead yet, and only
+    the current owner can mark it disconnected.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS, backlog_size=SESSION_BACKLOG):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.backlog_size = backlog_size
+        self._lock = threading.Lock()
+        self._sessions = {}  # {token: Session}
+        self._idle = OrderedDict()  # {token: None} of disconnected sessions, least recently seen first
+        self._by_client = {}  # {client_id: token}
+        self.resumed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def create(self, client_id, owner):
+        """Starts a new session for a client, replacing any previous one."""
+        session = Session(secrets.token_urlsafe(24), client_id, owner, self.backlog_size)
+        with self._lock:
+            self._remove(self._by_client.get(client_id))
+            self._sessions[session.token] = session
+            self._by_client[client_id] = session.token
+            self._evict()
+        return session
+
+    def resume(self, token, client_id, seq, owner):
+        """Returns (session, missed updates) if the session can be resumed from `seq`, otherwise (None, None)."""
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(token)
+            updates = None
+            if session is not None and session.client_id == client_id:
+                updates = session.updates_since(seq)
+            if updates is None:
+                self.rejected += 1
+                return None, None
+            self._idle.pop(token, None)
+            session.owner = owner
+            session.last_seen = time.monotonic()
+            self.resumed += 1
+            return session, updates
+
+    def record(self, client_id, message_type, data):
+        """Appends an update to the client's session backlog. Returns its sequence number, or None without a session."""
+        with self._lock:
+            token = self._by_client.get(client_id)
+            if token is None:
+                return None
+            session = self._sessions[token]
+            session.seq += 1
+            session.backlog.append((session.seq, message_type, data))
+            return session.seq
+
+    def disconnected(self, session, owner):
+        with self._lock:
+            if self._sessions.get(session.token) is session and session.owner is owner:
+                session.owner = None
+                session.last_seen = time.monotonic()
+                self._idle[session.token] = None
+
+    def drop_client(self, client_id):
+        """Forgets a client's session, e.g. when the client is removed."""
+        with self._lock:
+            self._remove(self._by_client.get(client_id))
+
+    def client_ids(self):
+        """Returns the ids of all clients with a live or resumable session."""
+        with self._lock:
+            self._evict()
+            return list(self._by_client)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "connected": len(self._sessions) - len(self._idle),
+                    "resumed": self.resumed, "rejected": self.rejected, "evicted": self.evicted}
+
+    def _remove(self, token):
+        """Caller holds the lock."""
+        session = self._sessions.pop(token, None) if token is not None else None
+        if session is not None:
+            self._idle.pop(token, None)
+            if self._by_client.get(session.client_id) == token:
+                del self._by_client[session.client_id]
+
+    def _evict(self):
+        """Drops expired sessions, then the least recently seen ones over the limit. Caller holds the lock."""
+        now = time.monotonic()
+        while self._idle:
+            token = next(iter(self._idle))
+            if now - self._sessions[token].last_seen <= self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            self._remove(token)
+            self.evicted += 1
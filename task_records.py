@@ -0,0 +1,204 @@
+import sys
+import time
+import datetime
+import functools
+from enum import IntEnum
+
+
+class TaskStatus(IntEnum):
+    PENDING = 0
+    IN_PROGRESS = 1
+    COMPLETED = 2
+    OVERDUE = 3
+
+    @property
+    def label(self):
+        return STATUS_LABELS[self]
+
+    @classmethod
+    def parse(cls, label):
+        """Returns the status for a wire/JSON label such as "In Progress". Raises ValueError if unknown."""
+        try:
+            return _STATUS_BY_LABEL[label]
+        except KeyError:
+            raise ValueError(f"Unknown task status: {label!r}")
+
+    @classmethod
+    def parse_stored(cls, label):
+        """Like parse(), for labels read from existing data files, which older versions didn't validate.
+
+        Labels are matched ignoring case and surrounding spaces; unknown ones load
+        as PENDING, with a warning, so the task stays open and can be fixed.
+        """
+        status = _STATUS_BY_LABEL.get(label) or _STATUS_BY_FOLDED_LABEL.get(str(label).strip().casefold())
+        if status is None:
+            if label not in _unknown_labels:
+                _unknown_labels.add(label)
+                print(f"Unknown task status {label!r} in stored data, loading it as {STATUS_LABELS[cls.PENDING]!r}.")
+            return cls.PENDING
+        return status
+
+
+STATUS_LABELS = ("Pending", "In Progress", "Completed", "Overdue")
+OPEN_STATUSES = (TaskStatus.PENDING, TaskStatus.IN_PROGRESS)  # Statuses that can still become overdue
+_STATUS_BY_LABEL = {label: TaskStatus(i) for i, label in enumerate(STATUS_LABELS)}
+_STATUS_BY_FOLDED_LABEL = {label.casefold(): status for label, status in _STATUS_BY_LABEL.items()}
+_unknown_labels = set()  # Stored labels already warned about
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"  # Same as notification timestamps, local time
+
+
+@functools.lru_cache(maxsize=8192)  # Few distinct dates: also shares the ordinal int objects
+def parse_due_date(text):
+    """Returns (ordinal, None) for a "YYYY-MM-DD" date, or (0, text) if it can't be parsed."""
+    try:
+        return datetime.date.fromisoformat(text).toordinal(), None
+    except (TypeError, ValueError):
+        return 0, text
+
+
+def format_timestamp(seconds):
+    return None if seconds is None else time.strftime(TIMESTAMP_FORMAT, time.localtime(seconds))
+
+
+def parse_timestamp(text):
+    """Returns epoch seconds for a TIMESTAMP_FORMAT string, or None if missing or unparseable."""
+    try:
+        return int(datetime.datetime.strptime(text, TIMESTAMP_FORMAT).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+class TaskRecord:
+    """Compact in-memory task. Status is a TaskStatus and the due date a date ordinal.
+
+    Free-text due dates that aren't valid ISO dates are kept verbatim in `due_text`
+    (with `due` = 0, so they sort first). `uid` is a server-wide id that, unlike
+    the task's list position, never changes. `created` and `completed` are epoch
+    seconds, None for tasks from before they were recorded and, for `completed`,
+    while the task isn't completed. Dicts are only produced at the edges:
+    `to_dict()` for storage and `to_wire()` for client messages.
+    """
+    __slots__ = ("description", "due", "status", "due_text", "uid", "created", "completed")
+
+    def __init__(self, description, due, status=TaskStatus.PENDING, due_text=None, uid=None, created=None, completed=None):
+        self.description = description
+        self.due = due
+        self.status = status
+        self.due_text = due_text
+        self.uid = uid
+        self.created = created
+        self.completed = completed
+
+    @classmethod
+    def create(cls, description, due_date, status="Pending", uid=None, created=None, completed=None):
+        due, due_text = parse_due_date(due_date)
+        status = TaskStatus.parse(status)
+        if status != TaskStatus.COMPLETED:
+            completed = None
+        return cls(description, due, status, due_text, uid, created, completed)
+
+    @classmethod
+    def from_dict(cls, data):
+        due, due_text = parse_due_date(data["due_date"])
+        status = TaskStatus.parse_stored(data["status"])
+        completed = parse_timestamp(data.get("completed_at")) if status == TaskStatus.COMPLETED else None
+        return cls(data["description"], due, status, due_text, data.get("uid"), parse_timestamp(data.get("created_at")),
+                   completed)
+
+    @property
+    def due_date(self):
+        if self.due_text is not None:
+            return self.due_text
+        return datetime.date.fromordinal(self.due).isoformat()
+
+    @due_date.setter
+    def due_date(self, text):
+        self.due, self.due_text = parse_due_date(text)
+
+    @property
+    def status_label(self):
+        return STATUS_LABELS[self.status]
+
+    def set_status(self, status, now=None):
+        """Changes the status, stamping `completed` when the task becomes completed and clearing it if reopened."""
+        if status != TaskStatus.COMPLETED:
+            self.completed = None
+        elif self.status != TaskStatus.COMPLETED:
+            self.completed = int(time.time() if now is None else now)
+        self.status = status
+
+    def to_dict(self):
+        return {"uid": self.uid, "description": self.description, "due_date": self.due_date, "status": self.status_label,
+                "created_at": format_timestamp(self.created), "completed_at": format_timestamp(self.completed)}
+
+    def to_wire(self, task_id):
+        return {"task_id": task_id, **self.to_dict()}
+
+    def to_row(self):
+        return (self.description, self.due, int(self.status), self.due_text, self.uid, self.created, self.completed)
+
+    @classmethod
+    def from_row(cls, row):
+        description, due, status, due_text, *rest = row  # Older snapshots lack the uid and timestamps
+        uid, created, completed = (list(rest) + [None, None, None])[:3]
+        return cls(description, due, TaskStatus(status), due_text, uid, created, completed)
+
+    def __eq__(self, other):
+        if not isinstance(other, TaskRecord):
+            return NotImplemented
+        return self.to_row() == other.to_row()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"TaskRecord({self.description!r}, {self.due_date!r}, {self.status_label!r})"
+
+
+def tasks_from_json(data):
+    """Converts {client_id: [task dict]} as stored in tasks.json into TaskRecords."""
+    return {client_id: [TaskRecord.from_dict(task) for task in task_list] for client_id, task_list in data.items()}
+
+
+def tasks_to_json(tasks):
+    return {client_id: [task.to_dict() for task in task_list] for client_id, task_list in tasks.items()}
+
+
+def tasks_from_rows(data):
+    """Converts the compact {client_id: [row tuple]} snapshot layout into TaskRecords."""
+    return {client_id: [TaskRecord.from_row(row) for row in rows] for client_id, rows in data.items()}
+
+
+def tasks_to_rows(tasks):
+    return {client_id: [task.to_row() for task in task_list] for client_id, task_list in tasks.items()}
+
+
+def _benchmark(task_count):
+    """Compares the memory held by task dicts against TaskRecords."""
+    import tracemalloc
+
+    def make_dicts():
+        return {
+            f"client{c}": [
+                {"description": f"Task {c}-{i}", "due_date": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+                 "status": STATUS_LABELS[i % 3]}
+                for i in range(100)
+            ]
+            for c in range(max(1, task_count // 100))
+        }
+
+    results = {}
+    for label, build in (("dict", make_dicts), ("TaskRecord", lambda: tasks_from_json(make_dicts()))):
+        tracemalloc.start()
+        data = build()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[label] = current
+        del data
+    print(f"{max(1, task_count // 100) * 100} tasks")
+    for label, size in results.items():
+        print(f"  {label:<12} {size / 1e6:8.1f} MB  ({size / task_count:6.0f} bytes/task)")
+    print(f"  saving       {(1 - results['TaskRecord'] / results['dict']) * 100:8.1f} %")
+
+
+if __name__ == "__main__":
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,273 @@
+import io
+import os
+import ssl
+import sys
+import time
+import socket
+import select
+import subprocess
+import threading
+
+TLS_CERT_FILE = "server.crt"
+TLS_KEY_FILE = "server.key"
+HANDSHAKE_TIMEOUT = 10  # Seconds a connecting client has to finish the TLS handshake
+POLL_INTERVAL = 1.0  # Longest wait for the socket before a TLS read or write is retried
+
+
+def _no_delay(sock):
+    # TLS sends handshake records and session tickets as separate small writes;
+    # with Nagle's algorithm they can wait ~40 ms for the peer's delayed ACK
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class SerializedTLSSocket:
+    """A connected ssl.SSLSocket that several threads may read and write at once.
+
+    OpenSSL connection objects must not be used by two threads at the same time,
+    and the ssl module doesn't serialize them: the server reads a client on its
+    connection thread while the OutboundQueue thread writes to it, and the client
+    reads on its listener thread while the GUI writes. Every TLS call is made
+    under a per-connection lock on the non-blocking socket, and waiting for the
+    socket happens outside it, so a reader blocked on an idle connection never
+    holds up a writer. Supports what the app uses of a socket, including
+    makefile("r") and timeouts.
+    """
+
+    def __init__(self, tls_sock):
+        self._sock = tls_sock
+        self._lock = threading.Lock()
+        self._timeout = tls_sock.gettimeout()
+        self._io_refs = 0
+        self._closed = False
+        tls_sock.setblocking(False)
+
+    def _call(self, method, *args):
+        """Calls an SSLSocket I/O method under the lock, waiting outside it while TLS needs the socket."""
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        while True:
+            with self._lock:
+                try:
+                    return method(*args)
+                except ssl.SSLWantReadError:
+                    readable, writable = [self._sock], []
+                except ssl.SSLWantWriteError:
+                    readable, writable = [], [self._sock]
+            wait = POLL_INTERVAL
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout("timed out")
+                wait = min(wait, remaining)
+            select.select(readable, writable, [], wait)
+
+    def recv(self, bufsize, flags=0):
+        return self._call(self._sock.recv, bufsize, flags)
+
+    def recv_into(self, buffer, nbytes=0, flags=0):
+        return self._call(self._sock.recv_into, buffer, nbytes, flags)
+
+    def send(self, data, flags=0):
+        return self._call(self._sock.send, data, flags)
+
+    def sendall(self, data, flags=0):
+        # OpenSSL wants a write it couldn't finish repeated with the same data, so the
+        # remaining slice only moves on after a successful send
+        remaining = memoryview(data).cast("B")
+        while remaining:
+            remaining = remaining[self.send(remaining, flags):]
+
+    def makefile(self, mode="r", buffering=None, *, encoding=None, errors=None, newline=None):
+        """Like socket.makefile(); closing the socket is deferred until the file is closed too."""
+        if mode not in ("r", "rb"):
+            raise ValueError(f"unsupported mode {mode!r}")
+        raw = socket.SocketIO(self, "r")
+        self._io_refs += 1
+        buffered = io.BufferedReader(raw, buffering if buffering and buffering > 0 else io.DEFAULT_BUFFER_SIZE)
+        if mode == "rb":
+            return buffered
+        text = io.TextIOWrapper(buffered, encoding, errors, newline)
+        text.mode = mode
+        return text
+
+    def _decref_socketios(self):
+        if self._io_refs > 0:
+            self._io_refs -= 1
+        if self._closed and self._io_refs == 0:
+            self._sock.close()
+
+    def close(self):
+        self._closed = True
+        if self._io_refs == 0:
+            self._sock.close()
+
+    def shutdown(self, how):
+        with self._lock:
+            self._sock.shutdown(how)
+
+    def settimeout(self, timeout):
+        self._timeout = timeout
+
+    def gettimeout(self):
+        return self._timeout
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def getpeername(self):
+        return self._sock.getpeername()
+
+    def version(self):
+        return self._sock.version()
+
+    @property
+    def session(self):
+        with self._lock:
+            return self._sock.session
+
+    @property
+    def session_reused(self):
+        return self._sock.session_reused
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def server_tls_context(certfile=TLS_CERT_FILE, keyfile=TLS_KEY_FILE):
+    """TLS context for the server. One context is shared by all connections, so its
+    session ticket keys and session cache let reconnecting clients skip the full handshake."""
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+def client_tls_context(cafile=TLS_CERT_FILE):
+    """TLS context for clients that trust `cafile`, e.g. the server's self-signed certificate."""
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=cafile)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    return context
+
+
+def server_handshake(context, sock, timeout=HANDSHAKE_TIMEOUT):
+    """Wraps an accepted socket and runs the handshake on the calling thread.
+
+    Called from the per-connection thread, so a slow or stalled client never holds
+    up the accept loop. Closes the socket and re-raises if the handshake fails.
+    """
+    try:
+        _no_delay(sock)
+        sock.settimeout(timeout)
+        tls_sock = context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False)
+        tls_sock.do_handshake()
+        tls_sock.settimeout(None)
+        return SerializedTLSSocket(tls_sock)
+    except (OSError, ssl.SSLError):
+        sock.close()
+        raise
+
+
+def client_handshake(context, sock, server_hostname, session=None):
+    """Wraps a connected socket, resuming `session` (an ssl.SSLSession from an earlier
+    connection) if the server still accepts it. The handshake uses the socket's timeout."""
+    _no_delay(sock)
+    return SerializedTLSSocket(context.wrap_socket(sock, server_hostname=server_hostname, session=session))
+
+
+def make_self_signed_cert(certfile=TLS_CERT_FILE, keyfile=TLS_KEY_FILE, hosts=("localhost", "127.0.0.1"), days=365):
+    """Creates a self-signed certificate for testing with the openssl command line tool."""
+    san = ",".join(f"IP:{host}" if host.replace(".", "").isdigit() else f"DNS:{host}" for host in hosts)
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+                    "-nodes", "-keyout", keyfile, "-out", certfile, "-days", str(days),
+                    "-subj", f"/CN={hosts[0]}", "-addext", f"subjectAltName={san}"],
+                   check=True, capture_output=True)
+
+
+def _benchmark(rounds, megabytes):
+    """Compares connection setup and bulk throughput of plaintext, a full TLS handshake and a resumed one."""
+    import tempfile
+
+    directory = tempfile.mkdtemp()
+    certfile, keyfile = os.path.join(directory, "server.crt"), os.path.join(directory, "server.key")
+    make_self_signed_cert(certfile, keyfile)
+    server_context = server_tls_context(certfile, keyfile)
+    client_context = client_tls_context(certfile)
+    payload = b"x" * (1024 * 1024)
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(16)
+    port = listener.getsockname()[1]
+    use_tls = [False]
+
+    def serve():
+        while True:
+            sock, _ = listener.accept()
+            if use_tls[0]:
+                sock = server_handshake(server_context, sock)
+            threading.Thread(target=drain, args=(sock,), daemon=True).start()
+
+    def drain(sock):
+        # Reads the announced number of bytes, then answers with one byte so the client can time the transfer
+        with sock:
+            remaining = int.from_bytes(sock.recv(8), "big")
+            while remaining > 0:
+                remaining -= len(sock.recv(256 * 1024))
+            sock.sendall(b".")
+
+    threading.Thread(target=serve, daemon=True).start()
+
+    def connect(tls, session=None):
+        sock = socket.create_connection(("127.0.0.1", port))
+        if tls:
+            sock = client_handshake(client_context, sock, "localhost", session)
+        return sock
+
+    def transfer(sock, count):
+        sock.sendall(count.to_bytes(8, "big"))
+        for _ in range(count // len(payload)):
+            sock.sendall(payload)
+        sock.sendall(payload[:count % len(payload)])
+        sock.recv(1)
+
+    print(f"{rounds} connections, {megabytes} MiB transfer")
+    for label, tls, resume in (("plaintext", False, False), ("TLS full", True, False), ("TLS resumed", True, True)):
+        use_tls[0] = tls
+        session = None
+        reused = 0
+        setup = 0.0
+        for _ in range(rounds):
+            start = time.perf_counter()
+            sock = connect(tls, session if resume else None)
+            setup += time.perf_counter() - start
+            if tls:
+                reused += sock.session_reused
+            transfer(sock, 5)
+            if tls:
+                session = sock.session  # Read after the server's reply, so TLS 1.3 tickets have arrived
+            sock.close()
+        setup_ms = setup / rounds * 1000
+
+        sock = connect(tls, session if resume else None)
+        start = time.perf_counter()
+        transfer(sock, megabytes * len(payload))
+        throughput = megabytes / (time.perf_counter() - start)
+        sock.close()
+        extra = f"  {reused}/{rounds} resumed" if tls else ""
+        print(f"  {label:<12} connect {setup_ms:7.2f} ms  throughput {throughput:8.1f} MiB/s{extra}")
+    print(f"  server session stats: {server_context.session_stats()}")
+    listener.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["make-cert"]:
+        make_self_signed_cert(hosts=tuple(sys.argv[2:]) or ("localhost", "127.0.0.1"))
+        print(f"Wrote {TLS_CERT_FILE} and {TLS_KEY_FILE}")
+    else:
+        _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200, int(sys.argv[2]) if len(sys.argv) > 2 else 256)